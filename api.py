@@ -1,19 +1,48 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
-import shutil
+import asyncio
+import aiofiles
+from contextlib import asynccontextmanager
 
 from ingestion import KnowledgeBase
 from engine import SecureRAGEngine
-from schemas import QueryRequest, RAGResponse, DocumentUploadResponse
+from schemas import (
+    QueryRequest, RAGResponse, DocumentUploadResponse, StatusResponse,
+    DocumentListResponse, HealthResponse
+)
 from config import config, logger
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize the RAG system on startup and release its connections on shutdown."""
+    logger.info("Starting SecureRAG API", 
+                host=config.API_HOST, 
+                port=config.API_PORT)
+    
+    try:
+        app.state.kb = KnowledgeBase()
+        vectorstore = app.state.kb.get_vector_store(force_rebuild=False)
+        app.state.rag_engine = SecureRAGEngine(vectorstore, enable_memory=True)
+        # Serializes index edits so concurrent uploads/deletes don't drop each other's changes
+        app.state.index_lock = asyncio.Lock()
+        logger.info("RAG engine initialized successfully")
+    except Exception as e:
+        logger.error("Failed to initialize RAG engine", error=str(e))
+        raise
+    
+    yield
+    
+    await app.state.rag_engine.aclose()
+    await app.state.kb.aclose()
+
 # Initialize FastAPI
 app = FastAPI(
     title="SecureRAG API",
     description="Production-grade RAG system with Guardrails AI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS Configuration
@@ -25,31 +54,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global instances
-kb = None
-rag_engine = None
-
-@app.on_event("startup")
-async def startup_event():
-    """Initialize RAG system on startup."""
-    global kb, rag_engine
-    
-    logger.info("Starting SecureRAG API", 
-                host=config.API_HOST, 
-                port=config.API_PORT)
-    
-    try:
-        kb = KnowledgeBase()
-        vectorstore = kb.get_vector_store(force_rebuild=False)
-        rag_engine = SecureRAGEngine(vectorstore, enable_memory=True)
-        logger.info("RAG engine initialized successfully")
-    except Exception as e:
-        logger.error("Failed to initialize RAG engine", error=str(e))
-        raise
+UPLOAD_CHUNK_SIZE = 1 << 20
 
-@app.get("/health")
-async def health_check():
+@app.get("/health", response_model=HealthResponse)
+async def health_check(http_request: Request):
     """Health check endpoint."""
+    rag_engine = getattr(http_request.app.state, "rag_engine", None)
     return {
         "status": "healthy",
         "service": "SecureRAG",
@@ -61,14 +71,14 @@ async def health_check():
     }
 
 @app.post("/query", response_model=RAGResponse)
-async def query_endpoint(request: QueryRequest):
+async def query_endpoint(request: QueryRequest, http_request: Request):
     """Query the RAG system with optional conversation memory."""
     try:
         logger.info("Received query", 
                    query_preview=request.query[:50],
                    session_id=request.session_id)
         
-        result = rag_engine.query(
+        result = await http_request.app.state.rag_engine.query(
             user_query=request.query,
             session_id=request.session_id
         )
@@ -80,28 +90,28 @@ async def query_endpoint(request: QueryRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/query/stream")
-async def query_stream_endpoint(request: QueryRequest):
+async def query_stream_endpoint(request: QueryRequest, http_request: Request):
     """Stream the RAG response in real-time."""
     try:
         logger.info("Starting streaming query", 
                    query_preview=request.query[:50])
         
-        async def generate():
-            async for chunk in rag_engine.query_stream(
+        return StreamingResponse(
+            http_request.app.state.rag_engine.query_stream(
                 user_query=request.query,
                 session_id=request.session_id
-            ):
-                yield chunk
-        
-        return StreamingResponse(generate(), media_type="text/plain")
+            ),
+            media_type="text/plain"
+        )
     
     except Exception as e:
         logger.error("Streaming query failed", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/documents/upload", response_model=DocumentUploadResponse)
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(http_request: Request, file: UploadFile = File(...)):
     """Upload a document to the knowledge base."""
+    state = http_request.app.state
     try:
         allowed_extensions = [".txt", ".pdf"]
         file_ext = os.path.splitext(file.filename)[1].lower()
@@ -115,15 +125,17 @@ async def upload_document(file: UploadFile = File(...)):
         file_path = os.path.join(config.DOCS_PATH, file.filename)
         os.makedirs(config.DOCS_PATH, exist_ok=True)
         
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Stream the upload to disk in 1 MiB chunks without blocking the event loop
+        async with aiofiles.open(file_path, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await buffer.write(chunk)
         
         logger.info("Document uploaded", filename=file.filename, size=file.size)
         
-        vectorstore = kb.get_vector_store(force_rebuild=True)
-        
-        global rag_engine
-        rag_engine = SecureRAGEngine(vectorstore, enable_memory=True)
+        # Index a copy off the event loop, then swap it in for new queries
+        async with state.index_lock:
+            vectorstore = await asyncio.to_thread(state.kb.add_file, file_path)
+            await state.rag_engine.hot_swap_vectorstore(vectorstore)
         
         return DocumentUploadResponse(
             filename=file.filename,
@@ -136,9 +148,10 @@ async def upload_document(file: UploadFile = File(...)):
         logger.error("Document upload failed", error=str(e), filename=file.filename)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.delete("/documents/{filename}")
-async def delete_document(filename: str):
+@app.delete("/documents/{filename}", response_model=StatusResponse)
+async def delete_document(filename: str, http_request: Request):
     """Delete a document from the knowledge base."""
+    state = http_request.app.state
     try:
         file_path = os.path.join(config.DOCS_PATH, filename)
         
@@ -148,36 +161,41 @@ async def delete_document(filename: str):
         os.remove(file_path)
         logger.info("Document deleted", filename=filename)
         
-        vectorstore = kb.get_vector_store(force_rebuild=True)
-        
-        global rag_engine
-        rag_engine = SecureRAGEngine(vectorstore, enable_memory=True)
+        async with state.index_lock:
+            vectorstore = await asyncio.to_thread(state.kb.delete_file, filename)
+            await state.rag_engine.hot_swap_vectorstore(vectorstore)
         
         return {
             "status": "success",
-            "message": f"Document {filename} deleted and vector store rebuilt"
+            "message": f"Document {filename} deleted and removed from the vector store"
         }
     
     except Exception as e:
         logger.error("Document deletion failed", error=str(e), filename=filename)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/documents")
+def _scan_documents(path: str) -> list:
+    """List files in a directory using a single scandir pass."""
+    with os.scandir(path) as entries:
+        return [
+            {
+                "filename": entry.name,
+                "size": entry.stat().st_size,
+                "extension": os.path.splitext(entry.name)[1]
+            }
+            for entry in entries
+            if entry.is_file()
+        ]
+
+@app.get("/documents", response_model=DocumentListResponse)
 async def list_documents():
     """List all documents in the knowledge base."""
     try:
         if not os.path.exists(config.DOCS_PATH):
             return {"documents": []}
         
-        documents = []
-        for filename in os.listdir(config.DOCS_PATH):
-            file_path = os.path.join(config.DOCS_PATH, filename)
-            if os.path.isfile(file_path):
-                documents.append({
-                    "filename": filename,
-                    "size": os.path.getsize(file_path),
-                    "extension": os.path.splitext(filename)[1]
-                })
+        # Directory scans can stall on slow filesystems, so keep them off the event loop
+        documents = await asyncio.to_thread(_scan_documents, config.DOCS_PATH)
         
         return {"documents": documents, "count": len(documents)}
     
@@ -185,12 +203,13 @@ async def list_documents():
         logger.error("Failed to list documents", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.delete("/memory/{session_id}")
-async def clear_memory(session_id: str):
+@app.delete("/memory/{session_id}", response_model=StatusResponse)
+async def clear_memory(session_id: str, http_request: Request):
     """Clear conversation memory for a specific session."""
+    rag_engine = http_request.app.state.rag_engine
     try:
         if rag_engine.memory:
-            rag_engine.memory.clear_history(session_id)
+            await rag_engine.memory.clear_history(session_id)
             logger.info("Memory cleared", session_id=session_id)
             return {
                 "status": "success",
@@ -28,11 +28,31 @@ class AppConfig:
     # Model Settings
     MODEL_NAME: str = os.getenv("MODEL_NAME", "gpt-4o")
     TEMPERATURE: float = float(os.getenv("TEMPERATURE", "0.0"))
+    # Groups requests that share the static system prompt for OpenAI prompt caching
+    PROMPT_CACHE_KEY: str = os.getenv("PROMPT_CACHE_KEY", "securerag")
+    # Window for answering concurrent queries with one batched completion (0 disables)
+    QUERY_BATCH_WINDOW_MS: int = int(os.getenv("QUERY_BATCH_WINDOW_MS", "0"))
+    QUERY_BATCH_SIZE: int = int(os.getenv("QUERY_BATCH_SIZE", "8"))
     
     # RAG Settings
     CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", "1000"))
     CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "200"))
     K_RETRIEVAL: int = int(os.getenv("K_RETRIEVAL", "3"))
+    # Texts per embeddings request, and how many requests run at once while building the index
+    EMBED_BATCH_SIZE: int = int(os.getenv("EMBED_BATCH_SIZE", "1024"))
+    EMBED_CONCURRENCY: int = int(os.getenv("EMBED_CONCURRENCY", "4"))
+    
+    # Vector Index ("flat", "ivfflat", "ivfsq8", "ivfpq", "hnsw" or "hnswsq8"); non-flat indexes rebuild on delete
+    FAISS_INDEX_TYPE: str = os.getenv("FAISS_INDEX_TYPE", "flat")
+    FAISS_NLIST: int = int(os.getenv("FAISS_NLIST", "256"))
+    FAISS_PQ_M: int = int(os.getenv("FAISS_PQ_M", "16"))
+    FAISS_PQ_NBITS: int = int(os.getenv("FAISS_PQ_NBITS", "8"))
+    FAISS_NPROBE: int = int(os.getenv("FAISS_NPROBE", "8"))
+    FAISS_HNSW_M: int = int(os.getenv("FAISS_HNSW_M", "32"))
+    FAISS_EF_CONSTRUCTION: int = int(os.getenv("FAISS_EF_CONSTRUCTION", "128"))
+    FAISS_EF_SEARCH: int = int(os.getenv("FAISS_EF_SEARCH", "64"))
+    # Window for coalescing concurrent searches into one FAISS call (0 disables)
+    SEARCH_BATCH_WINDOW_MS: int = int(os.getenv("SEARCH_BATCH_WINDOW_MS", "0"))
     
     # Paths
     VECTOR_STORE_PATH: str = os.getenv("VECTOR_STORE_PATH", "faiss_index")
@@ -51,6 +71,13 @@ class AppConfig:
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", "6379"))
     REDIS_DB: int = int(os.getenv("REDIS_DB", "0"))
     REDIS_PASSWORD: str = os.getenv("REDIS_PASSWORD", "")
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "64"))
+    
+    # Response Cache
+    ENABLE_RESPONSE_CACHE: bool = os.getenv("ENABLE_RESPONSE_CACHE", "true").lower() == "true"
+    CACHE_TTL: int = int(os.getenv("CACHE_TTL", "3600"))
+    CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
     
     # Logging
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
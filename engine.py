@@ -1,226 +1,1084 @@
-import guardrails as gd
-from guardrails import Guard
-from guardrails.hub import ValidLength, ToxicLanguage, DetectPII
-import json
-from typing import Optional, List, Dict, AsyncIterator
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.messages import HumanMessage, AIMessage
+import asyncio
+import re
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional, List, Dict, Set, Tuple, AsyncIterator
+import numpy as np
+import orjson
+import json_repair
+import msgpack
+from pydantic import TypeAdapter, ValidationError
+from langchain_core.documents import Document
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+import httpx
 import redis
+import redis.asyncio as aioredis
 
 from config import config, logger
 from schemas import RAGResponse
 
+if TYPE_CHECKING:
+    from guardrails import Guard
+
+# Static instructions come first and the per-request context is appended last, so
+# the longest possible prefix is byte-identical across calls for prompt caching.
+_SYSTEM_PREFIX = """
+        You are a secure AI assistant. 
+        Answer the user question based ONLY on the Context at the end of this message.
+        
+        Rules:
+        1. If the answer is present, extract it and cite sources. Set confidence to "high".
+        2. If the answer is missing, return exactly: "I do not have enough information in the provided documents." and set confidence to "low".
+        3. OUTPUT FORMAT: Return ONLY a valid JSON object (no markdown, no code blocks, no extra text). Example:
+        {"answer": "Your answer here", "confidence": "high", "sources": ["file1.txt"]}
+        
+        Context:
+        """
+
+_STREAM_SYSTEM_PREFIX = """
+            You are a secure AI assistant. 
+            Answer the user question based ONLY on the Context at the end of this message.
+            
+            Rules:
+            1. If the answer is present, extract it and cite sources.
+            2. If the answer is missing, return: "I do not have enough information."
+            3. OUTPUT FORMAT: Return ONLY a valid JSON object whose first key is "answer". Example:
+            {"answer": "Your answer here", "confidence": "high", "sources": ["file1.txt"]}
+            
+            Context:
+            """
+
+_BATCH_SYSTEM_PREFIX = """
+        You are a secure AI assistant. 
+        You will receive numbered tuples, each with a question and its own context.
+        Answer each question based ONLY on the context in the same tuple.
+        
+        Rules:
+        1. If the answer is present, extract it and cite sources. Set confidence to "high".
+        2. If the answer is missing, return exactly: "I do not have enough information in the provided documents." and set confidence to "low".
+        3. OUTPUT FORMAT: Return ONLY a valid JSON object with an "answers" list, where element j answers tuple j+1. Example:
+        {"answers": [{"answer": "Your answer here", "confidence": "high", "sources": ["file1.txt"]}]}
+        """
+
+_ANSWER_KEY_RE = re.compile(r'"answer"\s*:\s*"')
+_STRING_SPECIAL_RE = re.compile(r'["\\]')
+_RAG_ADAPTER = TypeAdapter(RAGResponse)
+# Rejections for queries the API schema would refuse, e.g. from the CLI; built once, not validated per call
+_TOO_SHORT = {"answer": "Query too short.", "confidence": "low", "sources": []}
+_TOO_SHORT_JSON = orjson.dumps({"error": "Query too short"}).decode()
+_JSON_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+class _AnswerStreamParser:
+    """Incrementally extracts the "answer" string from a streamed JSON object.
+    
+    Text that does not look like a JSON object is passed through unchanged.
+    """
+    
+    def __init__(self):
+        self.state = "detect"
+        self.buffer = ""
+        self.escape = ""
+    
+    def feed(self, text: str) -> str:
+        """Consume a chunk of model output and return any answer text it completes."""
+        if self.state == "raw":
+            return text
+        if self.state == "done":
+            return ""
+        
+        self.buffer += text
+        if self.state == "detect":
+            head = self.buffer.lstrip()
+            if "```".startswith(head):
+                return ""
+            if head.startswith("```"):
+                # Wait for the fence's language tag to finish before deciding
+                if "\n" not in head:
+                    return ""
+                head = head.split("\n", 1)[1].lstrip()
+            if not head:
+                return ""
+            if head[0] != "{":
+                self.state = "raw"
+                out, self.buffer = self.buffer, ""
+                return out
+            self.state = "seek"
+        
+        if self.state == "seek":
+            match = _ANSWER_KEY_RE.search(self.buffer)
+            if not match:
+                return ""
+            self.state = "answer"
+            self.buffer = self.buffer[match.end():]
+        
+        out, self.buffer = self._consume_string(self.buffer), ""
+        return out
+    
+    def finish(self) -> str:
+        """Flush text that never resolved to an answer field."""
+        if self.state in ("detect", "seek"):
+            self.state = "done"
+            out, self.buffer = self.buffer, ""
+            return out
+        return ""
+    
+    def _consume_string(self, text: str) -> str:
+        # Copy plain runs as slices and only step through escapes character by character
+        out = []
+        pos = 0
+        while pos < len(text):
+            if self.escape:
+                self.escape += text[pos]
+                pos += 1
+                decoded, rest = self._decode_escape()
+                if decoded is not None:
+                    out.append(decoded)
+                    self.escape = ""
+                    if rest:
+                        # Characters read past an unpaired surrogate are string content again
+                        text, pos = rest + text[pos:], 0
+                continue
+            match = _STRING_SPECIAL_RE.search(text, pos)
+            if match is None:
+                out.append(text[pos:])
+                break
+            out.append(text[pos:match.start()])
+            pos = match.end()
+            if match.group() == '"':
+                self.state = "done"
+                break
+            self.escape = "\\"
+        return "".join(out)
+    
+    def _decode_escape(self) -> Tuple[Optional[str], str]:
+        """Return the decoded escape and any text to re-scan, or (None, "") while incomplete."""
+        esc = self.escape
+        if esc[1] != "u":
+            return _JSON_ESCAPES.get(esc[1], esc[1]), ""
+        if len(esc) < 6:
+            return None, ""
+        try:
+            code = int(esc[2:6], 16)
+        except ValueError:
+            # Drop malformed escapes from the model instead of failing the whole stream
+            return "", ""
+        if 0xDC00 <= code <= 0xDFFF:
+            # A lone low surrogate cannot be encoded as UTF-8
+            return "", ""
+        if not 0xD800 <= code <= 0xDBFF:
+            return chr(code), ""
+        
+        # A high surrogate only decodes together with the \uDCxx escape that follows it
+        if not "\\u".startswith(esc[6:8]):
+            return "", esc[6:]
+        if len(esc) < 12:
+            return None, ""
+        try:
+            low = int(esc[8:12], 16)
+        except ValueError:
+            low = None
+        if low is None or not 0xDC00 <= low <= 0xDFFF:
+            return "", esc[6:]
+        return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)), ""
+
+@lru_cache(maxsize=1)
+def _get_guard() -> "Guard":
+    """Build the Guardrails guard once per process; its validators load local models."""
+    from guardrails import Guard
+    from guardrails.hub import ValidLength, ToxicLanguage, DetectPII
+    
+    return Guard().use_many(
+        ValidLength(min=5, max=1000, on_fail="fix"),
+        ToxicLanguage(threshold=0.5, validation_method="sentence", on_fail="exception"),
+        DetectPII(pii_entities=["EMAIL_ADDRESS", "PHONE_NUMBER", "SSN"], on_fail="fix")
+    )
+
+def _hash_key(text: str) -> str:
+    """Short non-cryptographic digest for cache and dedup keys."""
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+def _normalize_query(user_query: str) -> str:
+    """Fold case and whitespace so trivially different phrasings share cache entries."""
+    return " ".join(user_query.lower().split())
+
+@lru_cache(maxsize=512)
+def _format_context(items: Tuple[Tuple[str, str], ...]) -> str:
+    """Render (source, content) pairs into the prompt context block."""
+    return "".join(f"Source: {source}\nContent: {content}\n\n" for source, content in items)
+
+async def _coalesce(stream: AsyncIterator[str], max_batch: int = 64, growth: int = 3,
+                    interval: float = 0.025) -> AsyncIterator[str]:
+    """Merge small stream chunks into growing batches, sending the first chunk immediately.
+    
+    Buffered text is sent once the interval has passed, even while the stream is stalled.
+    """
+    loop = asyncio.get_running_loop()
+    chunks = stream.__aiter__()
+    parts: List[str] = []
+    size, batch = 0, 1
+    deadline = loop.time() + interval
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(chunks.__anext__())
+            # Only wait out the deadline when there is buffered text it would delay
+            timeout = max(0.0, deadline - loop.time()) if parts else None
+            done, _ = await asyncio.wait((pending,), timeout=timeout)
+            if done:
+                next_chunk, pending = pending, None
+                try:
+                    text = next_chunk.result()
+                except StopAsyncIteration:
+                    break
+                parts.append(text)
+                size += len(text)
+            if parts and (size >= batch or loop.time() >= deadline):
+                yield "".join(parts)
+                parts, size = [], 0
+                batch = min(max_batch, batch * growth)
+                deadline = loop.time() + interval
+    finally:
+        if pending is not None:
+            pending.cancel()
+    if parts:
+        yield "".join(parts)
+
+class _StreamFlight:
+    """Replays one in-progress answer stream to every concurrent identical query.
+    
+    The stream runs in a task owned by the flight, so a subscriber going away only ends its
+    own replay; the generation is cancelled once the last subscriber has left.
+    """
+    
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        self.abandoned = False
+        self.task: Optional[asyncio.Task] = None
+    
+    def start(self, stream: AsyncIterator[str]) -> asyncio.Task:
+        """Run the stream in the background, publishing each chunk as it arrives."""
+        self.task = asyncio.ensure_future(self._run(stream))
+        return self.task
+    
+    async def _run(self, stream: AsyncIterator[str]):
+        try:
+            async for text in stream:
+                self.publish(text)
+            self.close()
+        except asyncio.CancelledError:
+            self.close(RuntimeError("Stream was cancelled"))
+            raise
+        except Exception as e:
+            self.close(e)
+    
+    def publish(self, text: str):
+        self.chunks.append(text)
+        self._notify()
+    
+    def close(self, error: Optional[Exception] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+    
+    def _notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+    
+    async def subscribe(self) -> AsyncIterator[str]:
+        """Yield every chunk published so far, then new ones until the stream closes."""
+        self.subscribers += 1
+        try:
+            i = 0
+            while True:
+                while i < len(self.chunks):
+                    yield self.chunks[i]
+                    i += 1
+                if self.done:
+                    if self.error:
+                        raise self.error
+                    return
+                await self.changed.wait()
+        finally:
+            self.subscribers -= 1
+            if not self.subscribers and not self.done and self.task is not None:
+                # Nobody is left to read the answer, so stop generating it
+                self.abandoned = True
+                self.task.cancel()
+
+def _redis_connection() -> dict:
+    return dict(
+        host=config.REDIS_HOST,
+        port=config.REDIS_PORT,
+        db=config.REDIS_DB,
+        password=config.REDIS_PASSWORD if config.REDIS_PASSWORD else None
+    )
+
+@lru_cache(maxsize=None)
+def _redis_available() -> bool:
+    """Probe Redis once per process; all later I/O goes through the async pools."""
+    # This is the only blocking Redis call, so fail fast instead of waiting on the OS connect timeout
+    probe = redis.Redis(**_redis_connection(), socket_connect_timeout=2, socket_timeout=2)
+    try:
+        probe.ping()
+        return True
+    finally:
+        probe.close()
+
+def _decode_message(raw: bytes) -> dict:
+    """Decode a stored history entry; entries written before the switch to MessagePack are JSON."""
+    # A MessagePack map never starts with "{", which would be the bare integer 123
+    if raw[:1] == b"{":
+        return orjson.loads(raw)
+    return msgpack.unpackb(raw)
+
+class _LoopRedisPools:
+    """Connection pools shared by every client on one event loop, closed with the last user."""
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.pools: Dict[bool, aioredis.BlockingConnectionPool] = {}
+        self.clients: Dict[bool, aioredis.Redis] = {}
+        self.users = 0
+    
+    def get(self, decode_responses: bool) -> aioredis.BlockingConnectionPool:
+        pool = self.pools.get(decode_responses)
+        if pool is None:
+            pool = self.pools[decode_responses] = aioredis.BlockingConnectionPool(
+                **_redis_connection(),
+                max_connections=config.REDIS_MAX_CONNECTIONS,
+                health_check_interval=30,
+                decode_responses=decode_responses
+            )
+        return pool
+    
+    def client(self, decode_responses: bool) -> aioredis.Redis:
+        client = self.clients.get(decode_responses)
+        if client is None:
+            client = self.clients[decode_responses] = aioredis.Redis(
+                connection_pool=self.get(decode_responses)
+            )
+        return client
+
+# redis.asyncio connections belong to the loop that opened them, so pools are per loop, not per process
+_loop_redis_pools: Dict[asyncio.AbstractEventLoop, _LoopRedisPools] = {}
+
+def _redis_pools() -> _LoopRedisPools:
+    """Return the running loop's pools, forgetting those of loops that have since closed."""
+    for loop in [loop for loop in _loop_redis_pools if loop.is_closed()]:
+        del _loop_redis_pools[loop]
+    loop = asyncio.get_running_loop()
+    pools = _loop_redis_pools.get(loop)
+    if pools is None:
+        pools = _loop_redis_pools[loop] = _LoopRedisPools(loop)
+    return pools
+
+class _LoopRedis:
+    """Redis client facade whose calls go to a client on the calling event loop's pools."""
+    
+    def __init__(self, memory: "ConversationMemory", decode_responses: bool):
+        self.memory = memory
+        self.decode_responses = decode_responses
+    
+    def __getattr__(self, name):
+        return getattr(self.memory._loop_pools().client(self.decode_responses), name)
+
 class ConversationMemory:
     """Manages conversation history with Redis backend."""
     
     def __init__(self):
         try:
-            self.redis_client = redis.Redis(
-                host=config.REDIS_HOST,
-                port=config.REDIS_PORT,
-                db=config.REDIS_DB,
-                password=config.REDIS_PASSWORD if config.REDIS_PASSWORD else None,
-                decode_responses=True
-            )
-            self.redis_client.ping()
-            self.use_redis = True
-            logger.info("Redis connection established")
+            _redis_available()
         except Exception as e:
             logger.warning("Redis unavailable, using in-memory storage", error=str(e))
             self.use_redis = False
             self.memory_store = {}
+            return
+        
+        # Pools are resolved on each call rather than here, so the memory can be built before
+        # the event loop that will use it is running
+        self.joined_pools: Set[_LoopRedisPools] = set()
+        self.redis_client = _LoopRedis(self, decode_responses=True)
+        # Messages are stored as MessagePack, which needs a client that returns raw bytes
+        self.binary_client = _LoopRedis(self, decode_responses=False)
+        self.use_redis = True
+        logger.info("Redis connection established")
+    
+    def _loop_pools(self) -> _LoopRedisPools:
+        pools = _redis_pools()
+        if pools not in self.joined_pools:
+            self.joined_pools.add(pools)
+            pools.users += 1
+        return pools
+    
+    async def aclose(self):
+        """Release this memory's share of the Redis pools; the last user on the loop disconnects them."""
+        if not self.use_redis:
+            return
+        joined, self.joined_pools = self.joined_pools, set()
+        loop = asyncio.get_running_loop()
+        for pools in joined:
+            pools.users -= 1
+            # Pools of other loops cannot be awaited from here and are dropped once their loop closes
+            if pools.users == 0 and pools.loop is loop:
+                for pool in pools.pools.values():
+                    await pool.disconnect()
     
-    def add_message(self, session_id: str, role: str, content: str):
+    async def add_message(self, session_id: str, role: str, content: str):
         """Add a message to conversation history."""
-        message = {"role": role, "content": content}
-        
+        await self.add_messages(session_id, [(role, content)])
+    
+    async def add_messages(self, session_id: str, messages: List[Tuple[str, str]]):
+        """Add several (role, content) messages to conversation history in one round trip."""
         if self.use_redis:
             key = f"conversation:{session_id}"
-            self.redis_client.rpush(key, json.dumps(message))
-            self.redis_client.expire(key, 3600)  # 1 hour TTL
+            async with self.binary_client.pipeline(transaction=False) as pipe:
+                pipe.rpush(key, *(msgpack.packb({"role": role, "content": content})
+                                  for role, content in messages))
+                pipe.expire(key, 3600)  # 1 hour TTL
+                await pipe.execute()
         else:
-            if session_id not in self.memory_store:
-                self.memory_store[session_id] = []
-            self.memory_store[session_id].append(message)
+            self.memory_store.setdefault(session_id, []).extend(
+                {"role": role, "content": content} for role, content in messages
+            )
     
-    def get_history(self, session_id: str, limit: int = 10) -> List[Dict]:
+    async def get_history(self, session_id: str, limit: int = 10) -> List[Dict]:
         """Retrieve conversation history."""
         if self.use_redis:
             key = f"conversation:{session_id}"
-            messages = self.redis_client.lrange(key, -limit, -1)
-            return [json.loads(msg) for msg in messages]
+            messages = await self.binary_client.lrange(key, -limit, -1)
+            return [_decode_message(msg) for msg in messages]
         else:
             return self.memory_store.get(session_id, [])[-limit:]
     
-    def clear_history(self, session_id: str):
+    async def clear_history(self, session_id: str):
         """Clear conversation history for a session."""
         if self.use_redis:
-            self.redis_client.delete(f"conversation:{session_id}")
+            await self.redis_client.delete(f"conversation:{session_id}")
         else:
             self.memory_store.pop(session_id, None)
 
+class LSHCache:
+    """Random-projection LSH index so semantic lookups only compare a few candidates."""
+    
+    def __init__(self, num_tables: int = 8, nbits: int = 16, seed: int = 0):
+        self.num_tables = num_tables
+        self.nbits = nbits
+        self.seed = seed
+        self.projections: Optional[np.ndarray] = None
+        self.buckets: Dict[Tuple[int, int], List[str]] = {}
+        self.entry_hashes: Dict[str, List[int]] = {}
+    
+    def _hash(self, embedding: np.ndarray) -> List[int]:
+        if self.projections is None:
+            # Projections are sized lazily so the index works with any embedding model
+            rng = np.random.RandomState(self.seed)
+            self.projections = rng.randn(embedding.shape[0], self.num_tables * self.nbits).astype(np.float32)
+        
+        bits = (embedding @ self.projections > 0).reshape(self.num_tables, self.nbits)
+        packed = np.packbits(bits, axis=1)
+        return [int.from_bytes(row.tobytes(), "big") for row in packed]
+    
+    def add(self, entry_id: str, embedding: np.ndarray):
+        """Index an embedding under the given entry id."""
+        self.remove(entry_id)
+        hashes = self._hash(embedding)
+        for table, h in enumerate(hashes):
+            self.buckets.setdefault((table, h), []).append(entry_id)
+        self.entry_hashes[entry_id] = hashes
+    
+    def remove(self, entry_id: str):
+        """Drop an entry from every table it was hashed into."""
+        hashes = self.entry_hashes.pop(entry_id, None)
+        if hashes is None:
+            return
+        for table, h in enumerate(hashes):
+            bucket = self.buckets.get((table, h))
+            if bucket is None:
+                continue
+            bucket.remove(entry_id)
+            if not bucket:
+                del self.buckets[(table, h)]
+    
+    def candidates(self, embedding: np.ndarray) -> Set[str]:
+        """Return the ids sharing at least one bucket with the embedding."""
+        if not self.entry_hashes:
+            return set()
+        result = set()
+        for table, h in enumerate(self._hash(embedding)):
+            result.update(self.buckets.get((table, h), ()))
+        return result
+
+class ResponseCache:
+    """Two-tier cache of validated RAG responses: exact-match and semantic."""
+    
+    def __init__(self, redis_client=None, max_entries: int = None, ttl: int = None,
+                 threshold: float = None):
+        self.redis_client = redis_client
+        self.max_entries = max_entries or config.CACHE_MAX_ENTRIES
+        self.ttl = ttl or config.CACHE_TTL
+        self.threshold = threshold if threshold is not None else config.SEMANTIC_CACHE_THRESHOLD
+        self.entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.embeddings: Dict[str, np.ndarray] = {}
+        self.index = LSHCache()
+    
+    @staticmethod
+    def make_key(user_query: str) -> str:
+        """Build the exact-match cache key for a query."""
+        return _hash_key(f"{config.MODEL_NAME}|{_normalize_query(user_query)}")
+    
+    async def clear(self):
+        """Drop every cached response, locally and in Redis."""
+        self.entries.clear()
+        self.embeddings.clear()
+        self.index = LSHCache()
+        
+        if self.redis_client is not None:
+            try:
+                keys = [key async for key in self.redis_client.scan_iter("rag:response:*")]
+                if keys:
+                    await self.redis_client.delete(*keys)
+            except Exception as e:
+                logger.warning("Response cache clear failed", error=str(e))
+    
+    async def get(self, key: str) -> Optional[dict]:
+        """Look up an exact-match entry, falling back to Redis."""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        
+        if self.redis_client is not None:
+            try:
+                cached = await self.redis_client.get(f"rag:response:{key}")
+            except Exception as e:
+                logger.warning("Response cache lookup failed", error=str(e))
+                return None
+            if cached:
+                result = orjson.loads(cached)
+                self._remember(key, result)
+                return result
+        return None
+    
+    def get_similar(self, embedding: np.ndarray) -> Optional[dict]:
+        """Return the cached response whose query embedding is most similar, if above threshold."""
+        keys = list(self.index.candidates(embedding))
+        if not keys:
+            return None
+        
+        scores = np.stack([self.embeddings[k] for k in keys]) @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        
+        key = keys[best]
+        self.entries.move_to_end(key)
+        return self.entries[key]
+    
+    async def set(self, key: str, result: dict, embedding: Optional[np.ndarray] = None):
+        """Store a response under its exact key and, optionally, its query embedding."""
+        self._remember(key, result, embedding)
+        
+        if self.redis_client is not None:
+            try:
+                await self.redis_client.setex(f"rag:response:{key}", self.ttl, orjson.dumps(result))
+            except Exception as e:
+                logger.warning("Response cache write failed", error=str(e))
+    
+    def _remember(self, key: str, result: dict, embedding: Optional[np.ndarray] = None):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        if embedding is not None:
+            self.embeddings[key] = embedding
+            self.index.add(key, embedding)
+        
+        while len(self.entries) > self.max_entries:
+            evicted, _ = self.entries.popitem(last=False)
+            self.embeddings.pop(evicted, None)
+            self.index.remove(evicted)
+
+class SearchBatcher:
+    """Coalesces vector searches arriving within a short window into one FAISS call."""
+    
+    def __init__(self, vectorstore, window: float, k: int):
+        self.vectorstore = vectorstore
+        self.window = window
+        self.k = k
+        self.pending: List[Tuple[np.ndarray, asyncio.Future]] = []
+        # Several flushes can overlap, and the loop only keeps weak references to tasks
+        self.flush_tasks: Set[asyncio.Task] = set()
+    
+    async def search(self, embedding: np.ndarray) -> List[Document]:
+        """Queue an embedding and wait for the batched search results."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((embedding, future))
+        if len(self.pending) == 1:
+            loop.call_later(self.window, self._start_flush)
+        return await future
+    
+    def _start_flush(self):
+        task = asyncio.ensure_future(self._flush())
+        self.flush_tasks.add(task)
+        task.add_done_callback(self.flush_tasks.discard)
+    
+    async def _flush(self):
+        batch, self.pending = self.pending, []
+        matrix = np.stack([embedding for embedding, _ in batch]).astype(np.float32)
+        try:
+            results = await asyncio.to_thread(self._search, matrix)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), docs in zip(batch, results):
+            if not future.done():
+                future.set_result(docs)
+    
+    def _search(self, matrix: np.ndarray) -> List[List[Document]]:
+        import faiss
+        
+        # Mirrors FAISS.similarity_search_by_vector, one row per queued query
+        vectorstore = self.vectorstore
+        if getattr(vectorstore, "_normalize_L2", False):
+            faiss.normalize_L2(matrix)
+        _, indices = vectorstore.index.search(matrix, self.k)
+        
+        results = []
+        for row in indices:
+            docs = []
+            for i in row:
+                if i == -1:
+                    continue
+                doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[i])
+                if isinstance(doc, Document):
+                    docs.append(doc)
+            results.append(docs)
+        return results
+
+class QueryBatcher:
+    """Coalesces generations arriving within a short window into one batched LLM call."""
+    
+    def __init__(self, handler, window: float, max_batch: int):
+        self.handler = handler
+        self.window = window
+        self.max_batch = max_batch
+        self.pending: List[Tuple[Tuple[str, str], asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        # The loop only keeps weak references to tasks, so running flushes are held here
+        self.flush_tasks: Set[asyncio.Task] = set()
+    
+    async def submit(self, user_query: str, context: str) -> str:
+        """Queue a (query, context) pair and wait for its raw model output."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append(((user_query, context), future))
+        if len(self.pending) >= self.max_batch:
+            self._start_flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self._start_flush)
+        return await future
+    
+    def _start_flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.ensure_future(self._flush(batch))
+            self.flush_tasks.add(task)
+            task.add_done_callback(self.flush_tasks.discard)
+    
+    async def _flush(self, batch):
+        try:
+            results = await self.handler([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), text in zip(batch, results):
+            if not future.done():
+                future.set_result(text)
+
 class SecureRAGEngine:
     def __init__(self, vectorstore, enable_memory: bool = True):
-        self.retriever = vectorstore.as_retriever(search_kwargs={"k": config.K_RETRIEVAL})
-        self.llm = ChatOpenAI(
-            model=config.MODEL_NAME, 
+        from langchain_openai import ChatOpenAI
+        
+        self.vectorstore = vectorstore
+        self.embeddings = vectorstore.embeddings
+        self.search_batcher = None
+        if config.SEARCH_BATCH_WINDOW_MS > 0:
+            self.search_batcher = SearchBatcher(
+                vectorstore, config.SEARCH_BATCH_WINDOW_MS / 1000, config.K_RETRIEVAL
+            )
+        self.query_batcher = None
+        if config.QUERY_BATCH_WINDOW_MS > 0:
+            self.query_batcher = QueryBatcher(
+                self._complete_batch, config.QUERY_BATCH_WINDOW_MS / 1000, config.QUERY_BATCH_SIZE
+            )
+        self._swap_lock = asyncio.Lock()
+        # Bumped on every vector store swap so work started against the old corpus is not cached
+        self.corpus_epoch = 0
+        
+        # Both LLM clients share one HTTP connection pool for the engine's lifetime
+        self.http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+        )
+        self.client = AsyncOpenAI(api_key=config.OPENAI_API_KEY, http_client=self.http_client)
+        self.streaming_llm = ChatOpenAI(
+            model=config.MODEL_NAME,
             temperature=config.TEMPERATURE,
-            api_key=config.OPENAI_API_KEY
+            api_key=config.OPENAI_API_KEY,
+            streaming=True,
+            max_retries=2,
+            http_async_client=self.http_client
         )
         
-        # Initialize Guardrails Guard with validators
-        self.guard = Guard().use_many(
-            ValidLength(min=5, max=1000, on_fail="fix"),
-            ToxicLanguage(threshold=0.5, validation_method="sentence", on_fail="exception"),
-            DetectPII(pii_entities=["EMAIL_ADDRESS", "PHONE_NUMBER", "SSN"], on_fail="fix")
-        )
+        self.guard = _get_guard()
         
-        self.chain = self._build_chain()
         self.memory = ConversationMemory() if enable_memory else None
+        
+        # Response cache shares the conversation memory's Redis connection when available
+        self.response_cache = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._stream_flights: Dict[str, _StreamFlight] = {}
+        self.embed_cache: Dict[str, np.ndarray] = {}
+        self.retrieval_cache: "OrderedDict[str, List[Document]]" = OrderedDict()
+        self.cache_redis = self.memory.redis_client if self.memory and self.memory.use_redis else None
+        if config.ENABLE_RESPONSE_CACHE:
+            self.response_cache = ResponseCache(redis_client=self.cache_redis)
+        
         logger.info("SecureRAG engine initialized", 
                    model=config.MODEL_NAME, 
-                   memory_enabled=enable_memory)
+                   memory_enabled=enable_memory,
+                   cache_enabled=self.response_cache is not None)
 
-    def _format_docs(self, docs):
-        context = ""
-        for doc in docs:
-            source = doc.metadata.get("source", "unknown")
-            context += f"Source: {source}\nContent: {doc.page_content}\n\n"
-        return context
-
-    def _build_chain(self):
-        system_prompt = """
-        You are a secure AI assistant. 
-        Answer the user question based ONLY on the following Context.
+    async def hot_swap_vectorstore(self, vectorstore):
+        """Point retrieval at a new vector store, keeping clients and connection pools alive."""
+        async with self._swap_lock:
+            self.vectorstore = vectorstore
+            self.embeddings = vectorstore.embeddings
+            self.corpus_epoch += 1
+            if self.search_batcher:
+                self.search_batcher.vectorstore = vectorstore
+            # Cached retrievals and answers were computed against the old corpus
+            await self.clear_caches()
+        logger.info("Vector store swapped", vectors=vectorstore.index.ntotal)
+
+    async def aclose(self):
+        """Release HTTP and Redis connection pools."""
+        await self.http_client.aclose()
+        if self.memory:
+            await self.memory.aclose()
+
+    async def _aembed_query(self, user_query: str) -> np.ndarray:
+        """Embed a query, memoizing by its hash."""
+        key = _hash_key(user_query)
+        embedding = self.embed_cache.get(key)
+        if embedding is None:
+            embedding = np.asarray(await self.embeddings.aembed_query(user_query), dtype=np.float32)
+            self._cache_embedding(key, embedding)
+        return embedding
+
+    def _cache_embedding(self, key: str, embedding: np.ndarray):
+        if len(self.embed_cache) >= config.CACHE_MAX_ENTRIES:
+            self.embed_cache.pop(next(iter(self.embed_cache)))
+        self.embed_cache[key] = embedding
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        return embedding / (np.linalg.norm(embedding) or 1.0)
+
+    async def _aretrieve(self, user_query: str) -> List[Document]:
+        """Retrieve documents for a query, reusing results for repeated queries."""
+        key = _hash_key(_normalize_query(user_query))
+        docs = await self._get_cached_docs(key)
+        if docs is None:
+            epoch = self.corpus_epoch
+            embedding = await self._aembed_query(user_query)
+            if self.search_batcher:
+                docs = await self.search_batcher.search(embedding)
+            else:
+                docs = await self.vectorstore.asimilarity_search_by_vector(
+                    embedding.tolist(), k=config.K_RETRIEVAL
+                )
+            # Results from a search that raced a swap describe the old corpus
+            if epoch == self.corpus_epoch:
+                await self._set_cached_docs(key, docs)
+        return docs
+
+    async def _get_cached_docs(self, key: str) -> Optional[List[Document]]:
+        if not config.ENABLE_RESPONSE_CACHE:
+            return None
         
-        Context:
-        {context}
+        docs = self.retrieval_cache.get(key)
+        if docs is not None:
+            self.retrieval_cache.move_to_end(key)
+            return docs
         
-        Rules:
-        1. If the answer is present, extract it and cite sources. Set confidence to "high".
-        2. If the answer is missing, return exactly: "I do not have enough information in the provided documents." and set confidence to "low".
-        3. OUTPUT FORMAT: Return ONLY a valid JSON object (no markdown, no code blocks, no extra text). Example:
-        {{"answer": "Your answer here", "confidence": "high", "sources": ["file1.txt"]}}
-        """
+        if self.cache_redis is not None:
+            try:
+                cached = await self.cache_redis.get(f"rag:retrieval:{key}")
+            except Exception as e:
+                logger.warning("Retrieval cache lookup failed", error=str(e))
+                return None
+            if cached:
+                docs = [Document(**doc) for doc in orjson.loads(cached)]
+                self._remember_docs(key, docs)
+        return docs
 
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("human", "{question}"),
-        ])
+    async def _set_cached_docs(self, key: str, docs: List[Document]):
+        if not config.ENABLE_RESPONSE_CACHE:
+            return
+        
+        self._remember_docs(key, docs)
+        if self.cache_redis is not None:
+            try:
+                payload = [{"id": d.id, "page_content": d.page_content, "metadata": d.metadata} for d in docs]
+                await self.cache_redis.setex(f"rag:retrieval:{key}", config.CACHE_TTL, orjson.dumps(payload, default=str))
+            except Exception as e:
+                logger.warning("Retrieval cache write failed", error=str(e))
 
-        # LCEL Pipeline: Retrieve -> Format -> Prompt -> LLM -> String
-        return (
-            {
-                "context": self.retriever | self._format_docs, 
-                "question": RunnablePassthrough()
-            }
-            | prompt
-            | self.llm
-            | StrOutputParser()
+    def _remember_docs(self, key: str, docs: List[Document]):
+        self.retrieval_cache[key] = docs
+        if len(self.retrieval_cache) > config.CACHE_MAX_ENTRIES:
+            self.retrieval_cache.popitem(last=False)
+
+    async def clear_caches(self):
+        """Invalidate cached retrievals and responses, e.g. after the corpus changes."""
+        self.retrieval_cache.clear()
+        self.embed_cache.clear()
+        if self.response_cache:
+            await self.response_cache.clear()
+        
+        if self.cache_redis is not None:
+            try:
+                keys = [key async for key in self.cache_redis.scan_iter("rag:retrieval:*")]
+                if keys:
+                    await self.cache_redis.delete(*keys)
+            except Exception as e:
+                logger.warning("Retrieval cache clear failed", error=str(e))
+
+    def _format_docs(self, docs):
+        return _format_context(tuple(
+            (doc.metadata.get("source", "unknown"), doc.page_content) for doc in docs
+        ))
+
+    async def _agenerate(self, user_query: str) -> str:
+        """Retrieve context and generate a JSON answer with a single chat completion."""
+        docs = await self._aretrieve(user_query)
+        context = self._format_docs(docs)
+        if self.query_batcher:
+            return await self.query_batcher.submit(user_query, context)
+        return await self._complete(user_query, context)
+    
+    async def _complete(self, user_query: str, context: str) -> str:
+        # JSON mode guarantees a parseable object, so extraction hits its fast path
+        response = await self.client.chat.completions.create(
+            model=config.MODEL_NAME,
+            temperature=config.TEMPERATURE,
+            response_format={"type": "json_object"},
+            prompt_cache_key=f"{config.PROMPT_CACHE_KEY}:query",
+            messages=[
+                {"role": "system", "content": _SYSTEM_PREFIX + context},
+                {"role": "user", "content": user_query}
+            ]
+        )
+        return response.choices[0].message.content or ""
+    
+    async def _complete_batch(self, items: List[Tuple[str, str]]) -> List[str]:
+        """Answer several (query, context) tuples with one completion, one JSON object each."""
+        if len(items) == 1:
+            return [await self._complete(*items[0])]
+        
+        tuples = "".join(
+            f"Tuple {i}: {user_query}\nContext {i}:\n{context}\n"
+            for i, (user_query, context) in enumerate(items, 1)
+        )
+        response = await self.client.chat.completions.create(
+            model=config.MODEL_NAME,
+            temperature=config.TEMPERATURE,
+            response_format={"type": "json_object"},
+            prompt_cache_key=f"{config.PROMPT_CACHE_KEY}:batch",
+            messages=[
+                {"role": "system", "content": _BATCH_SYSTEM_PREFIX},
+                {"role": "user", "content": tuples}
+            ]
         )
+        try:
+            answers = orjson.loads(response.choices[0].message.content or "")["answers"]
+            if not isinstance(answers, list) or len(answers) != len(items):
+                raise ValueError("Batched response does not match the number of tuples")
+            logger.info("Answered queries in one batch", batch_size=len(items))
+            return [orjson.dumps(answer).decode() for answer in answers]
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning("Batched response unusable, answering individually",
+                           error=str(e), batch_size=len(items))
+            return list(await asyncio.gather(*(self._complete(q, c) for q, c in items)))
     
     def _extract_json_from_response(self, response: str) -> dict:
         """Extract JSON from response, handling markdown code blocks."""
+        # Fast path: the model usually returns a bare JSON object
+        stripped = response.lstrip()
+        if stripped[:1] == "{":
+            try:
+                return orjson.loads(stripped)
+            except orjson.JSONDecodeError:
+                pass
+        
+        # Repair locally instead of re-asking the model: strips markdown fences and
+        # surrounding prose, and closes objects cut off mid-stream
+        repaired = json_repair.loads(response)
+        if isinstance(repaired, dict) and repaired:
+            return repaired
+        
+        # If all fails, return the raw response wrapped
+        return {
+            "answer": response,
+            "confidence": "low",
+            "sources": []
+        }
+
+    async def _answer(self, user_query: str, cache_key: str,
+                      query_embedding: Optional[np.ndarray]) -> dict:
+        """Generates, parses and validates an answer, caching it when validation succeeds."""
+        # LLM Generation
+        logger.info("Generating response", query=user_query[:100])
+        epoch = self.corpus_epoch
+        raw_response = await self._agenerate(user_query)
+        
+        # Extract and validate JSON response with Guardrails
         try:
-            # Try direct JSON parse first
-            return json.loads(response)
-        except json.JSONDecodeError:
-            # Try to extract from markdown code block
-            import re
-            json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', response, re.DOTALL)
-            if json_match:
-                try:
-                    return json.loads(json_match.group(1))
-                except json.JSONDecodeError:
-                    pass
+            try:
+                # Well-formed replies are parsed and validated in one pydantic-core pass
+                result_dict = _RAG_ADAPTER.validate_json(raw_response).model_dump()
+                validated = True
+            except ValidationError:
+                # Otherwise extract JSON from the response (handles markdown code blocks)
+                result_dict = self._extract_json_from_response(raw_response)
+                validated = False
             
-            # Try to find any JSON object in the response
-            json_match = re.search(r'\{.*?\}', response, re.DOTALL)
-            if json_match:
-                try:
-                    return json.loads(json_match.group(0))
-                except json.JSONDecodeError:
-                    pass
+            # Validate the structure
+            if not isinstance(result_dict, dict):
+                raise ValueError("Response is not a dictionary")
             
-            # If all fails, return the raw response wrapped
-            return {
-                "answer": response,
+            # Ensure required fields exist
+            if "answer" not in result_dict:
+                result_dict["answer"] = raw_response
+            if "confidence" not in result_dict:
+                result_dict["confidence"] = "low"
+            if "sources" not in result_dict:
+                result_dict["sources"] = []
+            
+            logger.info("Response parsed successfully")
+            
+            # Apply Guardrails validators to the answer field
+            try:
+                # Validators run local models; keep them off the event loop
+                guarded_answer = await asyncio.to_thread(self.guard.validate, result_dict["answer"])
+                if guarded_answer.validated_output != result_dict["answer"]:
+                    result_dict["answer"] = guarded_answer.validated_output
+                    validated = False
+                logger.info("Guardrails validators applied successfully")
+            except Exception as guard_error:
+                logger.error("Guardrails validation failed", error=str(guard_error))
+                # If validation fails (e.g., toxicity), raise the error
+                raise
+            
+            # Re-validate only when the answer was repaired or fixed by Guardrails
+            result = result_dict if validated else _RAG_ADAPTER.validate_python(result_dict).model_dump()
+            
+            # Only validated responses from the current corpus are worth reusing
+            if self.response_cache and epoch == self.corpus_epoch:
+                await self.response_cache.set(cache_key, result, query_embedding)
+            
+        except Exception as parse_error:
+            logger.error("Response parsing/validation failed", error=str(parse_error))
+            result = {
+                "answer": raw_response if isinstance(raw_response, str) else str(raw_response),
                 "confidence": "low",
                 "sources": []
             }
+        
+        return result
+
+    async def _singleflight(self, key: str, factory) -> dict:
+        """Runs factory once per key in its own task; concurrent callers with the same key await it."""
+        task = self._inflight.get(key)
+        if task is not None:
+            logger.info("Joining in-flight query", key=key)
+        else:
+            task = self._inflight[key] = asyncio.ensure_future(factory())
+            
+            def finished(done: asyncio.Task):
+                self._forget_flight(self._inflight, key, done)
+                if not done.cancelled():
+                    # Mark retrieved so a failure whose callers all went away is not reported as unhandled
+                    done.exception()
+            
+            task.add_done_callback(finished)
+        # Shield so a cancelled caller, leader included, stops waiting without cancelling the run
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _forget_flight(flights: dict, key: str, flight):
+        """Drop a finished flight unless a newer one has already taken its key."""
+        if flights.get(key) is flight:
+            del flights[key]
 
-    def query(self, user_query: str, session_id: Optional[str] = None) -> dict:
+    async def query(self, user_query: str, session_id: Optional[str] = None) -> dict:
         """Executes the guarded pipeline with optional conversation memory."""
         
         # 1. Input Guard (Basic Example)
         if len(user_query) < 3:
             logger.warning("Query too short", query_length=len(user_query))
-            return RAGResponse(
-                answer="Query too short.", 
-                confidence="low", 
-                sources=[]
-            ).model_dump()
+            return {**_TOO_SHORT, "sources": []}
 
         try:
             # 2. Add conversation context if memory is enabled
             if self.memory and session_id:
-                history = self.memory.get_history(session_id)
+                history = await self.memory.get_history(session_id)
                 logger.info("Retrieved conversation history", 
                            session_id=session_id, 
                            message_count=len(history))
             
-            # 3. LLM Generation
-            logger.info("Generating response", query=user_query[:100])
-            raw_response = self.chain.invoke(user_query)
+            # 3. Response cache: exact hits skip retrieval and LLM, semantic hits skip the LLM
+            cache_key = ResponseCache.make_key(user_query)
+            query_embedding = None
+            if self.response_cache:
+                cached = await self.response_cache.get(cache_key)
+                if cached is None:
+                    query_embedding = self._normalize(await self._aembed_query(user_query))
+                    cached = self.response_cache.get_similar(query_embedding)
+                if cached is not None:
+                    logger.info("Response cache hit", query=user_query[:100])
+                    result = {**cached, "sources": list(cached.get("sources", []))}
+                    if self.memory and session_id:
+                        await self.memory.add_messages(
+                            session_id, [("user", user_query), ("assistant", result.get("answer", ""))]
+                        )
+                    return result
             
-            # 4. Extract and validate JSON response with Guardrails
-            try:
-                # First, try to extract JSON from the response (handles markdown code blocks)
-                result_dict = self._extract_json_from_response(raw_response)
-                
-                # Validate the structure
-                if not isinstance(result_dict, dict):
-                    raise ValueError("Response is not a dictionary")
-                
-                # Ensure required fields exist
-                if "answer" not in result_dict:
-                    result_dict["answer"] = raw_response
-                if "confidence" not in result_dict:
-                    result_dict["confidence"] = "low"
-                if "sources" not in result_dict:
-                    result_dict["sources"] = []
-                
-                logger.info("Response parsed successfully")
-                
-                # Apply Guardrails validators to the answer field
-                try:
-                    guarded_answer = self.guard.validate(result_dict["answer"])
-                    result_dict["answer"] = guarded_answer.validated_output
-                    logger.info("Guardrails validators applied successfully")
-                except Exception as guard_error:
-                    logger.error("Guardrails validation failed", error=str(guard_error))
-                    # If validation fails (e.g., toxicity), raise the error
-                    raise
-                
-                # Create validated response object
-                validated_response = RAGResponse(**result_dict)
-                result = validated_response.model_dump()
-                
-            except Exception as parse_error:
-                logger.error("Response parsing/validation failed", error=str(parse_error))
-                result = {
-                    "answer": raw_response if isinstance(raw_response, str) else str(raw_response),
-                    "confidence": "low",
-                    "sources": []
-                }
+            # 4. Generation, shared by concurrent identical queries against the same corpus
+            result = await self._singleflight(
+                f"{self.corpus_epoch}:{cache_key}",
+                lambda: self._answer(user_query, cache_key, query_embedding)
+            )
+            result = {**result, "sources": list(result.get("sources", []))}
             
             # 5. Save to conversation memory
             if self.memory and session_id:
-                self.memory.add_message(session_id, "user", user_query)
-                self.memory.add_message(session_id, "assistant", result.get("answer", ""))
+                await self.memory.add_messages(
+                    session_id, [("user", user_query), ("assistant", result.get("answer", ""))]
+                )
                 logger.info("Saved to conversation memory", session_id=session_id)
             
             logger.info("Query completed successfully", 
@@ -241,53 +1099,58 @@ class SecureRAGEngine:
         """Executes the pipeline with streaming response."""
         
         if len(user_query) < 3:
-            yield json.dumps({"error": "Query too short"})
+            yield _TOO_SHORT_JSON
             return
         
         try:
             logger.info("Starting streaming query", query=user_query[:100])
             
-            # Stream LLM response
-            streaming_llm = ChatOpenAI(
-                model=config.MODEL_NAME,
-                temperature=config.TEMPERATURE,
-                api_key=config.OPENAI_API_KEY,
-                streaming=True
-            )
+            # Identical concurrent queries against the same corpus replay one shared stream
+            # instead of calling the LLM again
+            key = f"{self.corpus_epoch}:{ResponseCache.make_key(user_query)}"
+            flight = self._stream_flights.get(key)
+            if flight is not None and not flight.abandoned:
+                logger.info("Joining in-flight stream", key=key)
+            else:
+                flight = self._stream_flights[key] = _StreamFlight()
+                flight.start(self._stream_answer(user_query)).add_done_callback(
+                    lambda _: self._forget_flight(self._stream_flights, key, flight)
+                )
             
-            # Get context
-            docs = self.retriever.get_relevant_documents(user_query)
-            context = self._format_docs(docs)
-            
-            system_prompt = f"""
-            You are a secure AI assistant. 
-            Answer the user question based ONLY on the following Context.
-            
-            Context:
-            {context}
-            
-            Rules:
-            1. If the answer is present, extract it and cite sources.
-            2. If the answer is missing, return: "I do not have enough information."
-            """
-            
-            # Stream response
-            full_response = ""
-            async for chunk in streaming_llm.astream([
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_query}
-            ]):
-                if chunk.content:
-                    full_response += chunk.content
-                    yield chunk.content
+            answer_parts = []
+            async for text in _coalesce(flight.subscribe()):
+                answer_parts.append(text)
+                yield text
             
             # Save to memory after streaming completes
             if self.memory and session_id:
-                self.memory.add_message(session_id, "user", user_query)
-                self.memory.add_message(session_id, "assistant", full_response)
+                await self.memory.add_messages(
+                    session_id, [("user", user_query), ("assistant", "".join(answer_parts))]
+                )
             
             logger.info("Streaming query completed")
             
         except Exception as e:
             logger.error("Streaming query failed", error=str(e))
-            yield json.dumps({"error": str(e)})
\ No newline at end of file
+            yield orjson.dumps({"error": str(e)}).decode()
+    
+    async def _stream_answer(self, user_query: str) -> AsyncIterator[str]:
+        """Streams the "answer" field of the LLM response for a query."""
+        # Get context without blocking the event loop on the embedding call
+        docs = await self._aretrieve(user_query)
+        context = self._format_docs(docs)
+        
+        # Stream only the "answer" field as it arrives
+        parser = _AnswerStreamParser()
+        async for chunk in self.streaming_llm.astream([
+            {"role": "system", "content": _STREAM_SYSTEM_PREFIX + context},
+            {"role": "user", "content": user_query}
+        ], prompt_cache_key=f"{config.PROMPT_CACHE_KEY}:stream"):
+            if chunk.content:
+                text = parser.feed(chunk.content)
+                if text:
+                    yield text
+        
+        text = parser.finish()
+        if text:
+            yield text
@@ -1,19 +1,61 @@
 import os
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Iterator
 from datetime import datetime
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
+from concurrent.futures import ThreadPoolExecutor
 from langchain_core.documents import Document
 from config import config, logger
 
+# Loader class names in langchain_community.document_loaders, imported on first use
+LOADERS = {".txt": "TextLoader", ".pdf": "PyPDFLoader"}
+
+def _prefetch(paths: List[str]):
+    """Asks the kernel to start reading files in the background before they are parsed."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+def _scan_files(root: str) -> Iterator[os.DirEntry]:
+    """Yields files under root depth-first; DirEntry caches the stat used for metadata."""
+    with os.scandir(root) as entries:
+        for entry in sorted(entries, key=lambda e: e.name):
+            if entry.is_dir(follow_symlinks=False):
+                yield from _scan_files(entry.path)
+            elif entry.is_file():
+                yield entry
+
 class KnowledgeBase:
     def __init__(self):
-        self.embeddings = OpenAIEmbeddings(api_key=config.OPENAI_API_KEY)
+        from langchain_openai import OpenAIEmbeddings
+        from openai import DefaultAsyncHttpxClient
+        import httpx
+        
+        # Query embeddings are awaited on the request path, so give them a pooled async client
+        self.http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+        )
+        self.embeddings = OpenAIEmbeddings(
+            api_key=config.OPENAI_API_KEY,
+            chunk_size=config.EMBED_BATCH_SIZE,
+            max_retries=6,
+            http_async_client=self.http_client
+        )
         self.vectorstore = None
         logger.info("Knowledge base initialized")
 
+    async def aclose(self):
+        """Release the embeddings' HTTP connection pool."""
+        await self.http_client.aclose()
+
     def load_documents(self, filter_metadata: Optional[Dict] = None) -> List[Document]:
         """Loads documents from the configured directory with optional metadata filtering."""
         if not os.path.exists(config.DOCS_PATH):
@@ -25,51 +67,82 @@ class KnowledgeBase:
             logger.info("Created sample document")
             
         docs = []
-        loaders = {".txt": TextLoader, ".pdf": PyPDFLoader}
         
         logger.info("Scanning documents directory", path=config.DOCS_PATH)
-        for root, _, files in os.walk(config.DOCS_PATH):
-            for file in files:
-                ext = os.path.splitext(file)[1]
-                if ext in loaders:
-                    try:
-                        file_path = os.path.join(root, file)
-                        loader = loaders[ext](file_path)
-                        loaded_docs = loader.load()
-                        
-                        # Add enhanced metadata
-                        for doc in loaded_docs:
-                            doc.metadata.update({
-                                "filename": file,
-                                "extension": ext,
-                                "upload_date": datetime.now().isoformat(),
-                                "file_size": os.path.getsize(file_path)
-                            })
-                        
-                        # Apply metadata filtering if provided
-                        if filter_metadata:
-                            loaded_docs = [
-                                doc for doc in loaded_docs
-                                if all(doc.metadata.get(k) == v for k, v in filter_metadata.items())
-                            ]
-                        
-                        docs.extend(loaded_docs)
-                        logger.info("Loaded document", filename=file, doc_count=len(loaded_docs))
-                    except Exception as e:
-                        logger.error("Failed to load document", filename=file, error=str(e))
+        entries = [
+            entry for entry in _scan_files(config.DOCS_PATH)
+            if os.path.splitext(entry.name)[1] in LOADERS
+        ]
+        paths = [entry.path for entry in entries]
+        _prefetch(paths)
+        
+        # Load files concurrently; results are consumed in path order so the index stays deterministic
+        with ThreadPoolExecutor() as pool:
+            futures = [pool.submit(self._load_file, entry.path, entry.stat()) for entry in entries]
+        
+        for file_path, future in zip(paths, futures):
+            file = os.path.basename(file_path)
+            try:
+                loaded_docs = future.result()
+                
+                # Apply metadata filtering if provided
+                if filter_metadata:
+                    loaded_docs = [
+                        doc for doc in loaded_docs
+                        if all(doc.metadata.get(k) == v for k, v in filter_metadata.items())
+                    ]
+                
+                docs.extend(loaded_docs)
+                logger.info("Loaded document", filename=file, doc_count=len(loaded_docs))
+            except Exception as e:
+                logger.error("Failed to load document", filename=file, error=str(e))
         
         logger.info("Document loading complete", total_docs=len(docs))
         return docs
 
+    def _load_file(self, file_path: str, stat: Optional[os.stat_result] = None) -> List[Document]:
+        """Loads a single file and attaches the enhanced metadata."""
+        stat = stat or os.stat(file_path)
+        file = os.path.basename(file_path)
+        ext = os.path.splitext(file)[1]
+        from langchain_community import document_loaders
+        
+        loaded_docs = getattr(document_loaders, LOADERS[ext.lower()])(file_path).load()
+        
+        for doc in loaded_docs:
+            doc.metadata.update({
+                "filename": file,
+                "extension": ext,
+                "upload_date": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                "file_size": stat.st_size
+            })
+        return loaded_docs
+
+    def _split(self, docs: List[Document]) -> List[Document]:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=config.CHUNK_SIZE,
+            chunk_overlap=config.CHUNK_OVERLAP
+        )
+        return text_splitter.split_documents(docs)
+
     def get_vector_store(self, force_rebuild: bool = False):
         """Builds or loads the FAISS vector store."""
+        from langchain_community.vectorstores import FAISS
+        
         if os.path.exists(config.VECTOR_STORE_PATH) and not force_rebuild:
             logger.info("Loading existing vector store", path=config.VECTOR_STORE_PATH)
+            _prefetch([
+                os.path.join(config.VECTOR_STORE_PATH, name)
+                for name in ("index.faiss", "index.pkl")
+            ])
             self.vectorstore = FAISS.load_local(
                 config.VECTOR_STORE_PATH, 
                 self.embeddings, 
                 allow_dangerous_deserialization=True
             )
+            self._configure_index(self.vectorstore.index)
             return self.vectorstore
 
         logger.info("Building new vector store")
@@ -79,14 +152,196 @@ class KnowledgeBase:
             logger.error("No documents found for vector store creation")
             raise ValueError("No documents found. Add .txt or .pdf files to 'documents/'")
 
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=config.CHUNK_SIZE,
-            chunk_overlap=config.CHUNK_OVERLAP
-        )
-        splits = text_splitter.split_documents(docs)
+        splits = self._split(docs)
         logger.info("Document splitting complete", chunk_count=len(splits))
         
-        self.vectorstore = FAISS.from_documents(splits, self.embeddings)
+        self.vectorstore = FAISS.from_embeddings(
+            zip([doc.page_content for doc in splits], self._embed_documents(splits)),
+            self.embeddings,
+            metadatas=[doc.metadata for doc in splits],
+            ids=[doc.id for doc in splits] if any(doc.id for doc in splits) else None
+        )
+        self._optimize_index()
         self.vectorstore.save_local(config.VECTOR_STORE_PATH)
         logger.info("Vector store saved", path=config.VECTOR_STORE_PATH)
-        return self.vectorstore
\ No newline at end of file
+        return self.vectorstore
+
+    def _embed_documents(self, docs: List[Document]) -> List[List[float]]:
+        """Embeds documents in full-size batches, keeping several requests in flight."""
+        texts = [doc.page_content for doc in docs]
+        batch = config.EMBED_BATCH_SIZE
+        shards = [texts[i:i + batch] for i in range(0, len(texts), batch)]
+        with ThreadPoolExecutor(max_workers=config.EMBED_CONCURRENCY) as pool:
+            return [vector for vectors in pool.map(self.embeddings.embed_documents, shards)
+                    for vector in vectors]
+
+    def add_file(self, file_path: str):
+        """Embeds and indexes a single file into the existing vector store."""
+        if self.vectorstore is None:
+            if not os.path.exists(config.VECTOR_STORE_PATH):
+                # A fresh build already picks up the new file
+                return self.get_vector_store(force_rebuild=True)
+            self.get_vector_store()
+        self.vectorstore = self._snapshot()
+        
+        filename = os.path.basename(file_path)
+        stale_ids = self._chunk_ids(filename)
+        if stale_ids and not self._delete_chunks(stale_ids):
+            return self.get_vector_store(force_rebuild=True)
+        
+        splits = self._split(self._load_file(file_path))
+        if splits:
+            self.vectorstore.add_documents(splits)
+        self.vectorstore.save_local(config.VECTOR_STORE_PATH)
+        logger.info("Indexed document incrementally", filename=filename, chunk_count=len(splits))
+        return self.vectorstore
+
+    def delete_file(self, filename: str):
+        """Removes a file's chunks from the vector store without re-embedding the rest."""
+        if self.vectorstore is None:
+            self.get_vector_store()
+        self.vectorstore = self._snapshot()
+        
+        ids = self._chunk_ids(filename)
+        if ids and not self._delete_chunks(ids):
+            return self.get_vector_store(force_rebuild=True)
+        
+        self.vectorstore.save_local(config.VECTOR_STORE_PATH)
+        logger.info("Removed document from index", filename=filename, chunk_count=len(ids))
+        return self.vectorstore
+
+    def _snapshot(self):
+        """Copies the vector store so edits never touch the index live queries are reading."""
+        from langchain_community.vectorstores import FAISS
+        
+        vectorstore = FAISS.deserialize_from_bytes(
+            self.vectorstore.serialize_to_bytes(),
+            self.embeddings,
+            allow_dangerous_deserialization=True
+        )
+        self._configure_index(vectorstore.index)
+        return vectorstore
+
+    def _chunk_ids(self, filename: str) -> List[str]:
+        ids = []
+        for doc_id in self.vectorstore.index_to_docstore_id.values():
+            doc = self.vectorstore.docstore.search(doc_id)
+            if isinstance(doc, Document) and doc.metadata.get("filename") == filename:
+                ids.append(doc_id)
+        return ids
+
+    def _delete_chunks(self, ids: List[str]) -> bool:
+        import faiss
+        
+        # Only flat indexes renumber their vectors on removal the way LangChain's docstore
+        # mapping assumes; HNSW cannot remove at all and IVF keeps the old ids, so rebuild
+        index = self.vectorstore.index
+        if not isinstance(index, faiss.IndexFlat):
+            logger.warning("Index does not support deletion, rebuilding",
+                           index_type=type(index).__name__)
+            return False
+        self.vectorstore.delete(ids)
+        return True
+
+    def _optimize_index(self):
+        """Replaces the flat index built by LangChain with the configured ANN index."""
+        index_type = config.FAISS_INDEX_TYPE.lower()
+        if index_type == "flat":
+            return
+        
+        flat = self.vectorstore.index
+        if index_type == "ivfflat":
+            index = self._build_ivfflat_index(flat)
+        elif index_type == "ivfpq":
+            index = self._build_ivfpq_index(flat)
+        elif index_type == "ivfsq8":
+            index = self._build_ivfsq8_index(flat)
+        elif index_type == "hnsw":
+            index = self._build_hnsw_index(flat)
+        elif index_type == "hnswsq8":
+            index = self._build_hnswsq8_index(flat)
+        else:
+            logger.warning("Unknown FAISS index type, keeping flat index", index_type=index_type)
+            return
+        
+        if index is not None:
+            self._configure_index(index)
+            self.vectorstore.index = index
+            logger.info("Built approximate index", index_type=index_type, vectors=index.ntotal)
+
+    def _build_ivfflat_index(self, flat):
+        import faiss
+        
+        # Same inverted lists as IVF-PQ but exact vectors, trading memory for recall
+        return self._build_ivf_index(
+            flat, lambda quantizer: faiss.IndexIVFFlat(quantizer, flat.d, config.FAISS_NLIST)
+        )
+
+    def _build_ivfsq8_index(self, flat):
+        import faiss
+        
+        # int8 scalar quantization scans a quarter of the float32 bytes per vector
+        return self._build_ivf_index(
+            flat, lambda quantizer: faiss.IndexIVFScalarQuantizer(
+                quantizer, flat.d, config.FAISS_NLIST, faiss.ScalarQuantizer.QT_8bit
+            )
+        )
+
+    def _build_ivf_index(self, flat, make_index):
+        import faiss
+        
+        if flat.ntotal < config.FAISS_NLIST:
+            logger.warning("Corpus too small for IVF, keeping flat index",
+                           vectors=flat.ntotal, min_vectors=config.FAISS_NLIST)
+            return None
+        
+        vectors = flat.reconstruct_n(0, flat.ntotal)
+        index = make_index(faiss.IndexFlatL2(flat.d))
+        index.train(vectors)
+        index.add(vectors)
+        return index
+
+    def _build_ivfpq_index(self, flat):
+        import faiss
+        
+        # k-means needs at least one point per list and per PQ centroid
+        min_vectors = max(config.FAISS_NLIST, 2 ** config.FAISS_PQ_NBITS)
+        if flat.ntotal < min_vectors or flat.d % config.FAISS_PQ_M:
+            logger.warning("Corpus too small for IVF-PQ, keeping flat index",
+                           vectors=flat.ntotal, min_vectors=min_vectors)
+            return None
+        
+        vectors = flat.reconstruct_n(0, flat.ntotal)
+        quantizer = faiss.IndexFlatL2(flat.d)
+        index = faiss.IndexIVFPQ(quantizer, flat.d, config.FAISS_NLIST,
+                                 config.FAISS_PQ_M, config.FAISS_PQ_NBITS)
+        index.train(vectors)
+        index.add(vectors)
+        return index
+
+    def _build_hnsw_index(self, flat):
+        import faiss
+        
+        index = faiss.IndexHNSWFlat(flat.d, config.FAISS_HNSW_M)
+        index.hnsw.efConstruction = config.FAISS_EF_CONSTRUCTION
+        index.add(flat.reconstruct_n(0, flat.ntotal))
+        return index
+
+    def _build_hnswsq8_index(self, flat):
+        import faiss
+        
+        index = faiss.IndexHNSWSQ(flat.d, faiss.ScalarQuantizer.QT_8bit, config.FAISS_HNSW_M)
+        index.hnsw.efConstruction = config.FAISS_EF_CONSTRUCTION
+        vectors = flat.reconstruct_n(0, flat.ntotal)
+        # The quantizer only learns per-dimension ranges, so any corpus size trains it
+        index.train(vectors)
+        index.add(vectors)
+        return index
+
+    def _configure_index(self, index):
+        """Applies search-time parameters, which FAISS does not persist."""
+        if hasattr(index, "nprobe"):
+            index.nprobe = config.FAISS_NPROBE
+        if hasattr(index, "hnsw"):
+            # The candidate list must stay well above k or recall collapses
+            index.hnsw.efSearch = max(config.FAISS_EF_SEARCH, config.K_RETRIEVAL * 8)
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 from ingestion import KnowledgeBase
@@ -7,7 +8,7 @@ from config import config, logger
 # Ensure env var is set (or set it here for testing)
 # os.environ["OPENAI_API_KEY"] = "sk-..."
 
-def main():
+async def main():
     logger.info("Initializing Secure RAG System")
     
     # 1. Initialize Knowledge Base
@@ -31,7 +32,7 @@ def main():
             logger.info("Shutting down")
             break
             
-        result = rag_engine.query(query, session_id=session_id)
+        result = await rag_engine.query(query, session_id=session_id)
         
         # Display Result
         print("\n--- 🛡️ Guarded Response ---")
@@ -39,4 +40,4 @@ def main():
         print("---------------------------\n")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
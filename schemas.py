@@ -1,20 +1,17 @@
 from typing import List, Literal
-from pydantic import BaseModel, Field, validator
-from guardrails.hub import ValidLength, ToxicLanguage, DetectPII
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 class RAGResponse(BaseModel):
     """
-    Structured output schema for the RAG pipeline with advanced Guardrails validators.
-    The LLM is forced to adhere to this structure with toxicity and PII detection.
+    Structured output schema for the RAG pipeline.
+    The toxicity, PII and length checks on the answer run in the engine's Guardrails guard,
+    so importing the schemas does not load Guardrails.
     """
     
+    model_config = ConfigDict(frozen=True, str_strip_whitespace=True)
+    
     answer: str = Field(
-        description="The answer to the user's question based ONLY on the context.",
-        validators=[
-            ValidLength(min=5, max=1000, on_fail="fix"),
-            ToxicLanguage(threshold=0.5, validation_method="sentence", on_fail="exception"),
-            DetectPII(pii_entities=["EMAIL_ADDRESS", "PHONE_NUMBER", "SSN"], on_fail="fix")
-        ]
+        description="The answer to the user's question based ONLY on the context."
     )
     confidence: Literal["high", "medium", "low"] = Field(
         description="Confidence level in the answer based on available context."
@@ -23,12 +20,16 @@ class RAGResponse(BaseModel):
         description="List of filenames or document sources used to generate the answer."
     )
 
-    @validator('answer')
+    @field_validator('answer', mode='after')
+    @classmethod
     def validate_answer(cls, v):
-        """Validate and clean the answer."""
-        if not v or len(v.strip()) < 5:
+        """Validate the answer; surrounding whitespace is already stripped by the config."""
+        if len(v) < 5:
             raise ValueError("Answer must be at least 5 characters long")
-        return v.strip()
+        return v
+
+# Build the core validator at import so the first request doesn't pay for schema compilation
+RAGResponse.model_rebuild(force=True)
 
 class QueryRequest(BaseModel):
     """Request schema for API queries."""
@@ -41,4 +42,30 @@ class DocumentUploadResponse(BaseModel):
     filename: str
     status: str
     message: str
-    document_count: int = Field(default=1)
\ No newline at end of file
+    document_count: int = Field(default=1)
+
+class StatusResponse(BaseModel):
+    """Response schema for simple status messages."""
+    status: str
+    message: str
+
+class DocumentInfo(BaseModel):
+    """Metadata for a single stored document."""
+    filename: str
+    size: int
+    extension: str
+
+class DocumentListResponse(BaseModel):
+    """Response schema for listing documents."""
+    documents: List[DocumentInfo]
+    count: int = Field(default=0)
+
+class HealthResponse(BaseModel):
+    """Response schema for the health check."""
+    status: str
+    service: str
+    version: str
+    model: str
+    vector_store: bool
+    documents_path: bool
+    memory_enabled: bool
\ No newline at end of file
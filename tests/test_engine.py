@@ -8,39 +8,73 @@ import os
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from engine import ConversationMemory
+import asyncio
+import json
+from types import SimpleNamespace
+import numpy as np
 
-def test_conversation_memory_in_memory():
+from engine import ConversationMemory, ResponseCache, LSHCache, _format_context, _AnswerStreamParser, _StreamFlight, _coalesce, QueryBatcher, SearchBatcher, SecureRAGEngine, _decode_message, _redis_available, _redis_pools
+
+@pytest.fixture
+def rag_engine(monkeypatch):
+    """Engine over a one-chunk in-memory index, with Guardrails passing answers through."""
+    import engine as engine_module
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    
+    guard = SimpleNamespace(validate=lambda answer: SimpleNamespace(validated_output=answer))
+    monkeypatch.setattr(engine_module, "_get_guard", lambda: guard)
+    vectorstore = FAISS.from_texts(["RAG retrieves context before generating."],
+                                   DeterministicFakeEmbedding(size=16))
+    return SecureRAGEngine(vectorstore, enable_memory=False)
+
+@pytest.mark.asyncio
+async def test_conversation_memory_in_memory():
     """Test in-memory conversation storage (when Redis is unavailable)."""
     memory = ConversationMemory()
     
     session_id = "test-session"
-    memory.add_message(session_id, "user", "Hello")
-    memory.add_message(session_id, "assistant", "Hi there!")
+    await memory.add_message(session_id, "user", "Hello")
+    await memory.add_message(session_id, "assistant", "Hi there!")
     
-    history = memory.get_history(session_id)
+    history = await memory.get_history(session_id)
     
     assert len(history) >= 2
     assert history[-2]["role"] == "user"
     assert history[-1]["role"] == "assistant"
 
-def test_conversation_memory_clear():
+@pytest.mark.asyncio
+async def test_conversation_memory_add_messages():
+    """Test bulk message writes keep their order."""
+    memory = ConversationMemory()
+    
+    session_id = "test-session-bulk"
+    await memory.clear_history(session_id)
+    await memory.add_messages(session_id, [("user", "Question"), ("assistant", "Answer")])
+    
+    history = await memory.get_history(session_id)
+    assert [m["role"] for m in history] == ["user", "assistant"]
+    assert history[-1]["content"] == "Answer"
+
+@pytest.mark.asyncio
+async def test_conversation_memory_clear():
     """Test clearing conversation history."""
     memory = ConversationMemory()
     
     session_id = "test-session-clear"
-    memory.add_message(session_id, "user", "Test message")
+    await memory.add_message(session_id, "user", "Test message")
     
-    history_before = memory.get_history(session_id)
+    history_before = await memory.get_history(session_id)
     assert len(history_before) > 0
     
-    memory.clear_history(session_id)
-    history_after = memory.get_history(session_id)
+    await memory.clear_history(session_id)
+    history_after = await memory.get_history(session_id)
     
     # Should be empty after clearing
     assert len(history_after) == 0
 
-def test_conversation_memory_limit():
+@pytest.mark.asyncio
+async def test_conversation_memory_limit():
     """Test conversation history limit."""
     memory = ConversationMemory()
     
@@ -48,11 +82,446 @@ def test_conversation_memory_limit():
     
     # Add 15 messages
     for i in range(15):
-        memory.add_message(session_id, "user", f"Message {i}")
+        await memory.add_message(session_id, "user", f"Message {i}")
     
     # Get last 5
-    history = memory.get_history(session_id, limit=5)
+    history = await memory.get_history(session_id, limit=5)
     
     assert len(history) == 5
     assert history[0]["content"] == "Message 10"
     assert history[-1]["content"] == "Message 14"
+
+@pytest.mark.asyncio
+async def test_conversation_memory_aclose_keeps_shared_pools():
+    """Test closing one memory leaves the pools of others on the same loop usable."""
+    closed, memory = ConversationMemory(), ConversationMemory()
+    await closed.aclose()
+    
+    session_id = "test-session-shared"
+    await memory.clear_history(session_id)
+    await memory.add_message(session_id, "user", "Still connected")
+    assert (await memory.get_history(session_id))[-1]["content"] == "Still connected"
+    await memory.aclose()
+
+def test_decode_message_reads_legacy_json():
+    """Test history entries stored as JSON before the MessagePack switch still decode."""
+    import msgpack
+    
+    message = {"role": "user", "content": "Hello"}
+    assert _decode_message(msgpack.packb(message)) == message
+    assert _decode_message(json.dumps(message).encode()) == message
+
+def test_conversation_memory_built_outside_event_loop():
+    """Test a memory built before any loop runs keeps Redis when reachable and works on later loops."""
+    try:
+        redis_up = _redis_available()
+    except Exception:
+        redis_up = False
+    memory = ConversationMemory()
+    assert memory.use_redis == redis_up
+    
+    async def roundtrip(content):
+        await memory.add_message("test-session-sync", "user", content)
+        history = await memory.get_history("test-session-sync")
+        await memory.aclose()
+        return history[-1]["content"]
+    
+    assert asyncio.run(roundtrip("First loop")) == "First loop"
+    assert asyncio.run(roundtrip("Second loop")) == "Second loop"
+
+def test_redis_pools_are_per_event_loop():
+    """Test Redis pools are shared within an event loop but never reused by another one."""
+    async def pools():
+        return _redis_pools(), _redis_pools()
+    
+    first, again = asyncio.run(pools())
+    second, _ = asyncio.run(pools())
+    
+    assert first is again
+    assert second is not first
+
+def test_response_cache_key_normalization():
+    """Test cache keys ignore case and surrounding or repeated whitespace."""
+    assert ResponseCache.make_key("  What is   RAG? ") == ResponseCache.make_key("what is rag?")
+    assert ResponseCache.make_key("What is RAG?") != ResponseCache.make_key("What is LLM?")
+
+@pytest.mark.asyncio
+async def test_response_cache_exact_hit():
+    """Test exact-match lookups in the response cache."""
+    cache = ResponseCache(max_entries=4)
+    key = ResponseCache.make_key("What is RAG?")
+    result = {"answer": "Retrieval-augmented generation.", "confidence": "high", "sources": []}
+    
+    assert await cache.get(key) is None
+    await cache.set(key, result)
+    
+    assert await cache.get(key) == result
+    assert await cache.get(ResponseCache.make_key("What is LLM?")) is None
+
+@pytest.mark.asyncio
+async def test_response_cache_semantic_hit():
+    """Test semantic lookups respect the similarity threshold."""
+    cache = ResponseCache(max_entries=4, threshold=0.95)
+    result = {"answer": "Cached answer.", "confidence": "high", "sources": []}
+    embedding = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+    await cache.set("key", result, embedding)
+    
+    near = np.array([0.99, 0.1, 0.0], dtype=np.float32)
+    far = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+    
+    assert cache.get_similar(near / np.linalg.norm(near)) == result
+    assert cache.get_similar(far) is None
+
+@pytest.mark.asyncio
+async def test_response_cache_lru_eviction():
+    """Test least-recently-used entries are evicted first."""
+    cache = ResponseCache(max_entries=2)
+    await cache.set("a", {"answer": "a"})
+    await cache.set("b", {"answer": "b"})
+    await cache.get("a")
+    await cache.set("c", {"answer": "c"})
+    
+    assert await cache.get("a") is not None
+    assert await cache.get("b") is None
+    assert await cache.get("c") is not None
+
+def test_lsh_cache_candidates():
+    """Test LSH buckets return similar entries and forget removed ones."""
+    rng = np.random.RandomState(42)
+    index = LSHCache(num_tables=8, nbits=16)
+    base = rng.randn(64).astype(np.float32)
+    other = rng.randn(64).astype(np.float32)
+    index.add("base", base)
+    index.add("other", other)
+    
+    assert "base" in index.candidates(base + 0.01 * rng.randn(64).astype(np.float32))
+    
+    index.remove("base")
+    assert "base" not in index.candidates(base)
+
+def test_format_context():
+    """Test context formatting output and memoization."""
+    items = (("a.txt", "First chunk"), ("b.pdf", "Second chunk"))
+    context = _format_context(items)
+    
+    assert context == "Source: a.txt\nContent: First chunk\n\nSource: b.pdf\nContent: Second chunk\n\n"
+    assert _format_context(items) is context
+
+def _feed_in_chunks(text, size):
+    parser = _AnswerStreamParser()
+    out = [parser.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    out.append(parser.finish())
+    return "".join(out)
+
+def test_answer_stream_parser_extracts_answer():
+    """Test only the answer field is streamed, regardless of chunk boundaries."""
+    response = '{"answer": "Say \\"hi\\"\\n\\u00e9", "confidence": "high", "sources": ["a.txt"]}'
+    
+    for size in range(1, 8):
+        assert _feed_in_chunks(response, size) == 'Say "hi"\né'
+
+def test_answer_stream_parser_drops_malformed_escape():
+    """Test invalid or unpaired unicode escapes are skipped without aborting the stream."""
+    responses = {
+        '{"answer": "Bad \\uZZZZ escape", "confidence": "low", "sources": []}': "Bad  escape",
+        # Unpaired surrogates cannot be encoded as UTF-8, and must not swallow the closing quote
+        '{"answer": "hi \\ud83d", "confidence": "low", "sources": []}': "hi ",
+        '{"answer": "hi \\ud83d\\n\\u0041", "confidence": "low", "sources": []}': "hi \nA",
+        '{"answer": "lone \\udc00 low", "confidence": "low", "sources": []}': "lone  low",
+        '{"answer": "pair \\ud83d\\ude00", "confidence": "high", "sources": []}': "pair \U0001F600",
+    }
+    
+    for response, expected in responses.items():
+        for size in range(1, 8):
+            assert _feed_in_chunks(response, size) == expected
+
+def test_answer_stream_parser_passthrough():
+    """Test non-JSON output is streamed unchanged."""
+    assert _feed_in_chunks("Plain text answer.", 3) == "Plain text answer."
+
+@pytest.mark.asyncio
+async def test_stream_flight_replays_to_late_subscribers():
+    """Test followers receive chunks published before and after they join."""
+    flight = _StreamFlight()
+    flight.publish("Hello, ")
+    
+    async def collect():
+        return "".join([chunk async for chunk in flight.subscribe()])
+    
+    follower = asyncio.ensure_future(collect())
+    await asyncio.sleep(0)
+    flight.publish("world.")
+    flight.close()
+    
+    assert await follower == "Hello, world."
+
+@pytest.mark.asyncio
+async def test_query_stream_outlives_cancelled_leader(rag_engine):
+    """Test the first client disconnecting neither stops nor errors a joined stream."""
+    engine = rag_engine
+    
+    async def stream_answer(user_query):
+        for word in ("Hello, ", "shared ", "world."):
+            await asyncio.sleep(0.02)
+            yield word
+    
+    engine._stream_answer = stream_answer
+    
+    async def collect():
+        return "".join([text async for text in engine.query_stream("What is RAG?")])
+    
+    leader = asyncio.ensure_future(collect())
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(collect())
+    await asyncio.sleep(0.03)
+    leader.cancel()
+    
+    assert await follower == "Hello, shared world."
+    await asyncio.sleep(0.01)
+    assert engine._stream_flights == {}
+
+@pytest.mark.asyncio
+async def test_stream_flight_cancelled_when_abandoned():
+    """Test the generation stops once its last subscriber has left."""
+    async def tokens():
+        yield "Hello, "
+        await asyncio.Event().wait()
+    
+    flight = _StreamFlight()
+    task = flight.start(tokens())
+    
+    async def collect():
+        return "".join([chunk async for chunk in flight.subscribe()])
+    
+    subscriber = asyncio.ensure_future(collect())
+    await asyncio.sleep(0.01)
+    subscriber.cancel()
+    await asyncio.sleep(0.01)
+    
+    assert flight.abandoned
+    assert task.cancelled()
+
+@pytest.mark.asyncio
+async def test_singleflight_outlives_cancelled_leader():
+    """Test followers still get the shared result when the first caller is cancelled."""
+    engine = SecureRAGEngine.__new__(SecureRAGEngine)
+    engine._inflight = {}
+    calls = []
+    
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return {"answer": "Shared answer."}
+    
+    leader = asyncio.ensure_future(engine._singleflight("key", factory))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(engine._singleflight("key", factory))
+    await asyncio.sleep(0)
+    leader.cancel()
+    
+    assert await follower == {"answer": "Shared answer."}
+    assert len(calls) == 1
+    assert engine._inflight == {}
+
+@pytest.mark.asyncio
+async def test_coalesce_batches_small_chunks():
+    """Test tiny stream chunks are merged without delaying the first one."""
+    async def tokens():
+        for ch in "abcdefghijklmnopqrstuvwxyz" * 4:
+            yield ch
+    
+    batches = [text async for text in _coalesce(tokens(), interval=60)]
+    
+    assert batches[0] == "a"
+    assert "".join(batches) == "abcdefghijklmnopqrstuvwxyz" * 4
+    assert len(batches) < 10
+
+@pytest.mark.asyncio
+async def test_coalesce_flushes_buffered_text_during_a_pause():
+    """Test buffered text is sent when the interval expires, not with the next chunk."""
+    async def tokens():
+        yield "a"
+        await asyncio.sleep(0.005)
+        yield "b"
+        await asyncio.sleep(0.3)
+        yield "c"
+    
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    received = [(text, loop.time() - start) async for text in _coalesce(tokens(), interval=0.025)]
+    
+    assert [text for text, _ in received] == ["a", "b", "c"]
+    assert received[1][1] < 0.1
+
+@pytest.mark.asyncio
+async def test_query_batcher_coalesces_concurrent_queries():
+    """Test queries submitted together reach the handler as one batch."""
+    batches = []
+    
+    async def handler(items):
+        batches.append(items)
+        return [f"answer to {query}" for query, _ in items]
+    
+    batcher = QueryBatcher(handler, window=0.01, max_batch=8)
+    results = await asyncio.gather(*(batcher.submit(f"q{i}", "ctx") for i in range(3)))
+    
+    assert results == ["answer to q0", "answer to q1", "answer to q2"]
+    assert len(batches) == 1 and len(batches[0]) == 3
+
+@pytest.mark.asyncio
+async def test_search_batcher_coalesces_concurrent_searches():
+    """Test searches queued together share one flush and each get their own results."""
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    
+    embeddings = DeterministicFakeEmbedding(size=16)
+    vectorstore = FAISS.from_texts(["first chunk", "second chunk"], embeddings)
+    batcher = SearchBatcher(vectorstore, window=0.01, k=1)
+    
+    results = await asyncio.gather(*(
+        batcher.search(np.asarray(embeddings.embed_query(text), dtype=np.float32))
+        for text in ("first chunk", "second chunk")
+    ))
+    
+    assert [docs[0].page_content for docs in results] == ["first chunk", "second chunk"]
+    await asyncio.sleep(0)
+    assert not batcher.flush_tasks
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("batch_reply", [
+    {"answers": [{"answer": "Only one answer."}]},
+    {"answer": "No answers list."}
+])
+async def test_complete_batch_falls_back_to_single_completions(batch_reply):
+    """Test a batched reply without one answer per tuple is retried one query at a time."""
+    calls = []
+    
+    async def create(**kwargs):
+        calls.append(kwargs["prompt_cache_key"])
+        if kwargs["prompt_cache_key"].endswith(":batch"):
+            content = json.dumps(batch_reply)
+        else:
+            content = json.dumps({"answer": f"Answer to {kwargs['messages'][-1]['content']}"})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+    
+    engine = SecureRAGEngine.__new__(SecureRAGEngine)
+    engine.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    results = await engine._complete_batch([("q1", "ctx"), ("q2", "ctx")])
+    
+    assert [json.loads(r)["answer"] for r in results] == ["Answer to q1", "Answer to q2"]
+    assert len(calls) == 3 and calls[0].endswith(":batch")
+
+@pytest.mark.parametrize("response, expected", [
+    ('```json\n{"answer": "Fenced.", "confidence": "high", "sources": []}\n```',
+     {"answer": "Fenced.", "confidence": "high", "sources": []}),
+    ('Here you go: {"answer": "Inline.", "confidence": "medium", "sources": ["a.txt"]} Hope it helps.',
+     {"answer": "Inline.", "confidence": "medium", "sources": ["a.txt"]}),
+    ('{"answer": "Cut off mid', {"answer": "Cut off mid"}),
+    ("I cannot answer that from the documents.",
+     {"answer": "I cannot answer that from the documents.", "confidence": "low", "sources": []}),
+])
+def test_extract_json_from_response(rag_engine, response, expected):
+    """Test fenced, embedded and truncated JSON is repaired and plain prose is wrapped."""
+    assert rag_engine._extract_json_from_response(response) == expected
+
+class _CountingAdapter:
+    """Wraps the RAGResponse TypeAdapter to count re-validations of parsed answers."""
+    
+    def __init__(self, adapter):
+        self.adapter = adapter
+        self.python_calls = 0
+    
+    def validate_json(self, data):
+        return self.adapter.validate_json(data)
+    
+    def validate_python(self, data):
+        self.python_calls += 1
+        return self.adapter.validate_python(data)
+
+@pytest.fixture
+def counting_adapter(monkeypatch):
+    import engine as engine_module
+    
+    adapter = _CountingAdapter(engine_module._RAG_ADAPTER)
+    monkeypatch.setattr(engine_module, "_RAG_ADAPTER", adapter)
+    return adapter
+
+def _reply(answer="RAG retrieves context first.", confidence="high"):
+    async def agenerate(user_query):
+        return json.dumps({"answer": answer, "confidence": confidence, "sources": ["a.txt"]})
+    return agenerate
+
+@pytest.mark.asyncio
+async def test_answer_skips_revalidation_of_well_formed_reply(rag_engine, counting_adapter):
+    """Test a reply validated while parsing and untouched by Guardrails is not validated again."""
+    rag_engine._agenerate = _reply()
+    result = await rag_engine._answer("What is RAG?", "key", None)
+    
+    assert result == {"answer": "RAG retrieves context first.", "confidence": "high", "sources": ["a.txt"]}
+    assert counting_adapter.python_calls == 0
+
+@pytest.mark.asyncio
+async def test_answer_revalidates_guardrails_fix(rag_engine, counting_adapter):
+    """Test an answer rewritten by a Guardrails "fix" is validated again before caching."""
+    rag_engine._agenerate = _reply("Mail jane@example.com for details.")
+    rag_engine.guard = SimpleNamespace(
+        validate=lambda answer: SimpleNamespace(validated_output="Mail <EMAIL_ADDRESS> for details.")
+    )
+    result = await rag_engine._answer("Who do I contact?", "key", None)
+    
+    assert result["answer"] == "Mail <EMAIL_ADDRESS> for details."
+    assert counting_adapter.python_calls == 1
+    assert (await rag_engine.response_cache.get("key"))["answer"] == result["answer"]
+
+@pytest.mark.asyncio
+async def test_answer_invalid_confidence_falls_back_to_raw(rag_engine):
+    """Test a reply failing schema validation is returned raw with low confidence and not cached."""
+    rag_engine._agenerate = _reply(confidence="certain")
+    raw = await rag_engine._agenerate("What is RAG?")
+    result = await rag_engine._answer("What is RAG?", "key", None)
+    
+    assert result == {"answer": raw, "confidence": "low", "sources": []}
+    assert await rag_engine.response_cache.get("key") is None
+
+@pytest.mark.asyncio
+async def test_hot_swap_discards_answers_from_the_old_corpus(rag_engine):
+    """Test a generation straddling a swap is neither cached nor joined by later queries."""
+    release = asyncio.Event()
+    answers = iter(["Old corpus answer.", "New corpus answer."])
+    
+    async def agenerate(user_query):
+        answer = next(answers)
+        await release.wait()
+        return json.dumps({"answer": answer, "confidence": "high", "sources": []})
+    
+    rag_engine._agenerate = agenerate
+    stale = asyncio.ensure_future(rag_engine.query("What is RAG?"))
+    await asyncio.sleep(0.01)
+    await rag_engine.hot_swap_vectorstore(rag_engine.vectorstore)
+    fresh = asyncio.ensure_future(rag_engine.query("What is RAG?"))
+    await asyncio.sleep(0.01)
+    release.set()
+    
+    assert (await stale)["answer"] == "Old corpus answer."
+    assert (await fresh)["answer"] == "New corpus answer."
+    cached = await rag_engine.response_cache.get(ResponseCache.make_key("What is RAG?"))
+    assert cached["answer"] == "New corpus answer."
+
+@pytest.mark.asyncio
+async def test_hot_swap_discards_retrievals_from_the_old_corpus(rag_engine):
+    """Test search results that straddle a swap are not cached."""
+    release = asyncio.Event()
+    search = rag_engine.vectorstore.asimilarity_search_by_vector
+    
+    async def slow_search(*args, **kwargs):
+        await release.wait()
+        return await search(*args, **kwargs)
+    
+    rag_engine.vectorstore.asimilarity_search_by_vector = slow_search
+    retrieval = asyncio.ensure_future(rag_engine._aretrieve("What is RAG?"))
+    await asyncio.sleep(0.01)
+    await rag_engine.hot_swap_vectorstore(rag_engine.vectorstore)
+    release.set()
+    
+    assert await retrieval
+    assert not rag_engine.retrieval_cache
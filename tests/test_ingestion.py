@@ -36,6 +36,14 @@ def test_knowledge_base_initialization():
     assert kb.embeddings is not None
     assert kb.vectorstore is None
 
+@pytest.mark.asyncio
+async def test_knowledge_base_aclose():
+    """Test closing the knowledge base releases its embeddings' HTTP client."""
+    kb = KnowledgeBase()
+    await kb.aclose()
+    
+    assert kb.http_client.is_closed
+
 def test_load_documents(temp_docs_dir):
     """Test document loading."""
     kb = KnowledgeBase()
@@ -68,3 +76,77 @@ def test_document_metadata_enhancement(temp_docs_dir):
         assert "extension" in doc.metadata
         assert "upload_date" in doc.metadata
         assert "file_size" in doc.metadata
+
+def test_document_metadata_from_file_stat(temp_docs_dir):
+    """Test size and date metadata come from the file itself, so reloads are identical."""
+    os.makedirs(os.path.join(temp_docs_dir, "nested"))
+    with open(os.path.join(temp_docs_dir, "nested", "inner.txt"), "w") as f:
+        f.write("A nested document about retrieval.")
+    
+    kb = KnowledgeBase()
+    first = kb.load_documents()
+    second = kb.load_documents()
+    
+    assert {doc.metadata["filename"] for doc in first} == {"test.txt", "inner.txt"}
+    assert [doc.metadata for doc in first] == [doc.metadata for doc in second]
+    for doc in first:
+        assert doc.metadata["file_size"] == os.path.getsize(doc.metadata["source"])
+
+@pytest.mark.parametrize("index_type", ["flat", "ivfflat"])
+def test_incremental_add_and_delete(temp_docs_dir, monkeypatch, index_type):
+    """Test single files are indexed and removed without corrupting the docstore mapping."""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    
+    monkeypatch.setattr(config, "VECTOR_STORE_PATH", os.path.join(temp_docs_dir, "index"))
+    monkeypatch.setattr(config, "FAISS_INDEX_TYPE", index_type)
+    monkeypatch.setattr(config, "FAISS_NLIST", 1)
+    kb = KnowledgeBase()
+    kb.embeddings = DeterministicFakeEmbedding(size=32)
+    vectorstore = kb.get_vector_store(force_rebuild=True)
+    initial_count = vectorstore.index.ntotal
+    
+    new_file = os.path.join(temp_docs_dir, "new.txt")
+    with open(new_file, "w") as f:
+        f.write("A new document about vector databases.")
+    
+    updated = kb.add_file(new_file)
+    assert updated.index.ntotal > initial_count
+    # The store handed out earlier is left untouched for in-flight queries
+    assert vectorstore.index.ntotal == initial_count
+    
+    # Re-uploading a file replaces its chunks instead of duplicating them
+    assert kb.add_file(new_file).index.ntotal == updated.index.ntotal
+    
+    # Removing the first file leaves later vectors that the docstore must still resolve
+    os.remove(os.path.join(temp_docs_dir, "test.txt"))
+    remaining = kb.delete_file("test.txt")
+    assert remaining.index.ntotal == updated.index.ntotal - initial_count
+    results = remaining.similarity_search("vector databases", k=4)
+    assert [doc.metadata["filename"] for doc in results] == ["new.txt"]
+    
+    extra_file = os.path.join(temp_docs_dir, "extra.txt")
+    with open(extra_file, "w") as f:
+        f.write("An extra document about embeddings.")
+    results = kb.add_file(extra_file).similarity_search("embeddings", k=4)
+    assert sorted(doc.metadata["filename"] for doc in results) == ["extra.txt", "new.txt"]
+
+@pytest.mark.parametrize("index_type", ["ivfflat", "ivfsq8", "hnsw", "hnswsq8"])
+def test_approximate_index_build(temp_docs_dir, monkeypatch, index_type):
+    """Test the configured ANN index replaces the flat index and stays searchable after deletes."""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    
+    monkeypatch.setattr(config, "VECTOR_STORE_PATH", os.path.join(temp_docs_dir, "index"))
+    monkeypatch.setattr(config, "FAISS_INDEX_TYPE", index_type)
+    monkeypatch.setattr(config, "FAISS_NLIST", 1)
+    with open(os.path.join(temp_docs_dir, "other.txt"), "w") as f:
+        f.write("Another document about vector search.")
+    kb = KnowledgeBase()
+    kb.embeddings = DeterministicFakeEmbedding(size=32)
+    vectorstore = kb.get_vector_store(force_rebuild=True)
+    
+    assert type(vectorstore.index).__name__ != "IndexFlatL2"
+    assert vectorstore.similarity_search("machine learning", k=1)
+    
+    os.remove(os.path.join(temp_docs_dir, "other.txt"))
+    results = kb.delete_file("other.txt").similarity_search("machine learning", k=4)
+    assert [doc.metadata["filename"] for doc in results] == ["test.txt"]
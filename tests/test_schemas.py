@@ -3,12 +3,13 @@ Tests for schemas and validation.
 """
 
 import pytest
+import subprocess
 import sys
 import os
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from schemas import RAGResponse, QueryRequest, DocumentUploadResponse
+from schemas import RAGResponse, QueryRequest, DocumentUploadResponse, DocumentListResponse
 from pydantic import ValidationError
 
 def test_rag_response_valid():
@@ -32,6 +33,17 @@ def test_rag_response_invalid_confidence():
             sources=[]
         )
 
+def test_rag_response_core_validator():
+    """Test the precompiled validator applies the same rules as the constructor."""
+    validate = RAGResponse.__pydantic_validator__.validate_python
+    response = validate({"answer": "  A padded answer.  ", "confidence": "low", "sources": []})
+    
+    assert isinstance(response, RAGResponse)
+    assert response.answer == "A padded answer."
+    
+    with pytest.raises(ValidationError):
+        validate({"answer": "Fine answer.", "confidence": "invalid", "sources": []})
+
 def test_query_request_valid():
     """Test valid query request."""
     request = QueryRequest(
@@ -66,3 +78,20 @@ def test_document_upload_response():
     assert response.filename == "test.pdf"
     assert response.status == "success"
     assert response.document_count == 1
+
+def test_document_list_response():
+    """Test document list response serialization."""
+    response = DocumentListResponse(
+        documents=[{"filename": "test.pdf", "size": 1024, "extension": ".pdf"}],
+        count=1
+    )
+    
+    assert response.documents[0].filename == "test.pdf"
+    assert DocumentListResponse(documents=[]).count == 0
+
+def test_import_does_not_load_guardrails():
+    """Test schemas and engine import without pulling in Guardrails and its local models."""
+    code = "import sys, schemas, engine; sys.exit('guardrails' in sys.modules)"
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    
+    assert subprocess.run([sys.executable, "-c", code], cwd=root).returncode == 0